@@ -0,0 +1,154 @@
+import heapq
+import itertools
+import threading
+import time
+
+from eventlog import ErrorReporter
+
+
+class ActionExecutor:
+    # Executa as ações das tasks uma de cada vez, por ordem de prioridade.
+    # A thread só existe enquanto houver ações na fila, então um perfil ocioso
+    # não mantém threads extras.
+    def __init__(self, idle_timeout=1.0, on_idle=None, event_log=None):
+        self.idle_timeout = idle_timeout
+        self.on_idle = on_idle  # Chamado quando a fila esvazia após uma sequência de ações
+        self.event_log = event_log  # EventLog opcional: início/fim de cada ação
+        self.errors = ErrorReporter(event_log)
+        self.queue = []  # (-prioridade, seq, task, on_done, resume)
+        self.queued = set()  # Tasks com ação esperando na fila
+        self.current = None  # (prioridade, task) em execução
+        self.counter = itertools.count()
+        self.thread = None
+        self.cond = threading.Condition()
+
+    def submit(self, task, on_done=None):
+        # Coalescência: se a task já tem uma ação na fila ou em execução, o novo
+        # disparo é descartado
+        with self.cond:
+            if task in self.queued or (self.current and self.current[1] is task):
+                return False
+            self.push(task, on_done, None, next(self.counter))
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, daemon=True)
+                self.thread.start()
+            self.cond.notify()
+            return True
+
+    def push(self, task, on_done, resume, seq):
+        self.queued.add(task)
+        heapq.heappush(self.queue, (-getattr(task, 'priority', 0), seq, task, on_done, resume))
+
+    def cancel(self, task):
+        self.cancel_many([task])
+
+    def cancel_many(self, tasks):
+        # Tira da fila as ações pendentes das tasks, reconstruindo o heap uma vez
+        with self.cond:
+            cancelled = self.queued.intersection(tasks)
+            if cancelled:
+                self.queue = [entry for entry in self.queue if entry[2] not in cancelled]
+                heapq.heapify(self.queue)
+                self.queued -= cancelled
+
+    def is_busy(self, task):
+        with self.cond:
+            return task in self.queued or (self.current is not None and self.current[1] is task)
+
+    def should_yield(self):
+        # Chamado pela ação em execução entre cliques: existe algo mais urgente?
+        with self.cond:
+            if self.current is None or not self.queue:
+                return False
+            return -self.queue[0][0] > self.current[0]
+
+    def run(self):
+        while True:
+            with self.cond:
+                if not self.queue:
+                    self.cond.wait(self.idle_timeout)
+                if not self.queue:
+                    self.thread = None
+                    return
+                neg_priority, seq, task, on_done, resume = heapq.heappop(self.queue)
+                self.queued.discard(task)
+                self.current = (-neg_priority, task)
+            remaining = None
+            if self.event_log:
+                self.event_log.emit('action_start', task=task.name, priority=-neg_priority, resumed=resume is not None)
+            started = time.monotonic()
+            try:
+                if task.running:
+                    remaining = task.perform_action(self.should_yield, resume)
+                self.errors.clear(f"action:{task.name}")
+            except Exception as e:
+                self.errors.error(f"action:{task.name}", f"Erro ao executar ação da task {task.name}: {e}")
+            if self.event_log:
+                self.event_log.emit(
+                    'action_end', task=task.name, ms=round((time.monotonic() - started) * 1000, 2),
+                    preempted=remaining is not None
+                )
+            with self.cond:
+                self.current = None
+                if remaining is not None and task.running and task not in self.queued:
+                    # Preemptada: o restante volta para a fila no mesmo lugar
+                    self.push(task, on_done, remaining, seq)
+                    continue
+                idle = not self.queue
+            if on_done:
+                on_done(task)
+            if idle and self.on_idle:
+                try:
+                    self.on_idle()
+                    self.errors.clear('action_idle')
+                except Exception as e:
+                    self.errors.error('action_idle', f"Erro ao finalizar sequência de ações: {e}")
+
+
+class BurstResult:
+    def __init__(self, clicks, elapsed, completed, scheduled=None):
+        self.clicks = clicks
+        self.elapsed = elapsed
+        self.completed = completed  # False se parou antes do fim (stop ou preempção)
+        # Trecho do cronograma já coberto (até o próximo deadline); a retomada começa daí
+        self.scheduled = elapsed if scheduled is None else scheduled
+
+    @property
+    def rate(self):
+        return self.clicks / self.elapsed if self.elapsed > 0 else 0.0
+
+
+def precise_sleep_until(deadline, clock=time.monotonic, spin=0.0005):
+    # time.sleep até perto do deadline e espera ativa só no último trecho
+    remaining = deadline - clock()
+    if remaining > spin:
+        time.sleep(remaining - spin)
+    while clock() < deadline:
+        pass
+
+
+def run_click_burst(click, frequency, duration, should_stop=None, clock=time.monotonic, max_lag=2):
+    # Cliques em deadlines absolutos (início + n / frequência) no relógio monotônico:
+    # o tempo gasto em cada clique não se acumula. Se o atraso passar de max_lag
+    # intervalos (máquina travada), o cronograma é realinhado em vez de disparar rajadas.
+    interval = 1 / frequency
+    start = clock()
+    slot = 0
+    clicks = 0
+    completed = True
+    while slot * interval < duration - 1e-9:
+        if should_stop and should_stop():
+            completed = False
+            break
+        precise_sleep_until(start + slot * interval, clock)
+        click()
+        clicks += 1
+        slot += 1
+        lag = clock() - (start + slot * interval)
+        if lag > max_lag * interval:
+            slot += int(lag // interval)
+    # Cada clique ocupa seu intervalo até o próximo deadline; o burst completo
+    # conta a janela inteira pedida, não só até o último clique
+    scheduled = min(slot * interval, duration)
+    elapsed = max(clock() - start, duration if completed else scheduled)
+    return BurstResult(clicks, elapsed, completed, scheduled)
@@ -0,0 +1,308 @@
+import argparse
+import json
+import os
+import random
+import threading
+import time
+
+import numpy as np
+
+from capture import SyntheticBackend
+from engine import Engine
+from input_backends import RecordingInput
+from profile_compiler import load_profile
+from templates import PreparedTemplate, match_template, to_gray
+
+# Benchmark sem display: roda o Engine com um perfil, reproduz frames sintéticos
+# em que as condições de cor ligam e desligam em instantes conhecidos e mede o
+# caminho condição -> disparo -> clique com uma entrada de gravação no lugar do mouse.
+
+DEFAULT_PROFILES = ['profiles/Tap.json', 'profiles/SomosGuerreiros.JSON']
+DEFAULT_TEMPLATE_IMAGE = 'window_screenshot.png'
+# Patches pequenos (sem pirâmide) e grandes; (altura, largura)
+TEMPLATE_SIZES = [(9, 9), (12, 12), (20, 20), (40, 48), (80, 80)]
+
+
+class BenchWindow:
+    # Janela sintética no lugar da do pygetwindow: origem (0, 0) e sempre em foco,
+    # então posições relativas à janela e de tela coincidem
+    left = 0
+    top = 0
+    isActive = True
+
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+
+    def activate(self):
+        pass
+
+
+class ScriptedBackend(SyntheticBackend):
+    # Um único frame mutável: cada grab aplica as mudanças do roteiro já vencidas
+    def __init__(self, size, pixels, schedule, clock=time.monotonic):
+        width, height = size
+        super().__init__([np.zeros((height, width, 3), dtype=np.uint8)])
+        self.frame = self.frames[0]
+        self.pixels = pixels  # [(posição, cor ligada, cor desligada)]
+        self.schedule = sorted(schedule)  # [(tempo, índice do pixel, ligado)]
+        self.clock = clock
+        self.cursor = 0
+        self.start_time = None
+        for index in range(len(pixels)):
+            self.paint(index, False)
+
+    def paint(self, index, on):
+        (x, y), on_color, off_color = self.pixels[index]
+        self.frame[y, x] = on_color if on else off_color
+
+    def start(self, start_time):
+        self.start_time = start_time
+
+    def grab(self, region=None):
+        with self.lock:
+            if self.start_time is not None:
+                elapsed = self.clock() - self.start_time
+                while self.cursor < len(self.schedule) and self.schedule[self.cursor][0] <= elapsed:
+                    _, index, on = self.schedule[self.cursor]
+                    self.paint(index, on)
+                    self.cursor += 1
+        return super().grab(region)
+
+
+def build_schedule(count, duration, period, hold, seed):
+    # Cada condição liga a cada period segundos (com fase aleatória fixa pela
+    # seed) e fica ligada por hold segundos
+    rng = random.Random(seed)
+    schedule = []
+    for index in range(count):
+        t = rng.uniform(0.2, period)
+        while t + hold < duration:
+            schedule.append((t, index, True))
+            schedule.append((t + hold, index, False))
+            t += period
+    return schedule
+
+
+def percentile(values, q):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q / 100 * (len(ordered) - 1))))]
+
+
+def run_benchmark(profile_path, duration=10.0, period=1.0, hold=0.3, seed=0, capture_mode='points', click_only=False):
+    # O motor de verdade (Engine: scheduler, captura, executor e Task.perform_action)
+    # roda sem display sobre o roteiro sintético, com a entrada gravada
+    clock = time.monotonic
+    recorder = RecordingInput(clock)
+    # Perfil validado pelo compilador; posições antigas (absolutas) ficam como estão
+    compiled = load_profile(profile_path, origin=(0, 0))
+    colors = [task for task in compiled['tasks'] if task['condition_type'] == 'color']
+    # Frame do tamanho da área do perfil (mesmo sistema de coordenadas das posições)
+    area = compiled['selected_area']
+    points = [task['condition_position'] for task in colors]
+    right = max([x for x, _ in points] + ([area[0] + area[2]] if area else [0])) + 1
+    bottom = max([y for _, y in points] + ([area[1] + area[3]] if area else [0])) + 1
+    pixels = [
+        (task['condition_position'], task['condition_value'], tuple(255 - c for c in task['condition_value']))
+        for task in colors
+    ]
+    schedule = build_schedule(len(colors), duration, period, hold, seed)
+    backend = ScriptedBackend((right, bottom), pixels, schedule, clock)
+
+    engine = Engine(backend, recorder)
+    engine.frame_capture.capture_mode = capture_mode
+    engine.set_window(BenchWindow(right, bottom))
+    tasks = []
+    targets = {}  # task -> x do ponto de clique exclusivo
+    skipped = 0
+    for task in engine.load_profile(profile_path):
+        if task.condition_type not in ('time', 'color'):
+            # Templates e condições compostas não têm roteiro sintético
+            skipped += 1
+            continue
+        # Cada task clica num ponto só dela (fora do frame), para atribuir os
+        # cliques gravados; o caminho da ação (sessão, bursts, sequências) é o real
+        targets[task] = len(tasks)
+        target = (len(tasks), -1)
+        if click_only:
+            # Só o caminho até o disparo: um clique, sem bursts nem sequências ocupando o executor
+            task.action_type = 'click'
+        if task.action_type == 'sequence':
+            task.sequence = [target] * len(task.sequence)
+        else:
+            task.action_position = target
+        tasks.append(task)
+    color_tasks = [task for task in tasks if task.condition_type == 'color']
+
+    thread_peak = threading.active_count()
+    stop_sampling = threading.Event()
+
+    def sample_threads():
+        nonlocal thread_peak
+        while not stop_sampling.wait(0.05):
+            # Desconta a própria thread de amostragem
+            thread_peak = max(thread_peak, threading.active_count() - 1)
+
+    sampler = threading.Thread(target=sample_threads, daemon=True)
+    sampler.start()
+
+    cpu_start = time.process_time()
+    start = clock()
+    backend.start(start)
+    started = engine.start_tasks(tasks)
+    time.sleep(duration)
+    metrics = engine.scheduler.metrics()
+    engine.close()
+    cpu_time = time.process_time() - cpu_start
+    stop_sampling.set()
+    sampler.join()
+
+    # Cliques gravados por task (pelo ponto exclusivo de cada uma)
+    fired = {}
+    for event in recorder.events:
+        if event[1] == 'release':
+            fired.setdefault(event[3][0], []).append(event[0] - start)
+    # Latência: do instante em que a condição liga até o primeiro clique da task
+    latencies = []
+    missed = 0
+    for time_on, index, on in schedule:
+        if not on:
+            continue
+        task = color_tasks[index]
+        deadline = time_on + hold + task.poll_max
+        clicks = [t for t in fired.get(targets[task], []) if time_on <= t <= deadline]
+        if clicks:
+            latencies.append((clicks[0] - time_on) * 1000)
+        else:
+            missed += 1
+
+    summary = engine.metrics.summary().get('*', {})
+    frame_capture = engine.frame_capture
+    frames = frame_capture.frame_id
+    evaluations = sum(m['evaluations'] for m in metrics.values())
+    return {
+        'profile': os.path.basename(profile_path),
+        'tasks': len(tasks),
+        'color_tasks': len(color_tasks),
+        'skipped_tasks': skipped + len(tasks) - len(started),
+        'duration_s': duration,
+        'triggers': len(latencies) + missed,
+        'missed': missed,
+        'latency_ms': {
+            'p50': percentile(latencies, 50),
+            'p90': percentile(latencies, 90),
+            'p99': percentile(latencies, 99),
+            'max': max(latencies) if latencies else None,
+        },
+        'frames_per_s': frames / duration,
+        'evaluations_per_s': evaluations / duration,
+        'unchanged_frames': frame_capture.skipped_evaluations,
+        'cpu_ms_per_frame': cpu_time * 1000 / frames if frames else None,
+        'clicks': len(recorder.clicks()),
+        'thread_peak': thread_peak,
+        # Estágios globais (captura, avaliação, ativação, ação, gatilho -> clique)
+        'stages': {name: stats for name, stats in summary.items() if isinstance(stats, dict)},
+    }
+
+
+def run_template_benchmark(image_path, sizes=TEMPLATE_SIZES, trials=20, seed=0, search=(779, 442)):
+    # Recorta patches com textura do screenshot e mede a busca de cada um na
+    # região inteira. Acerto: achou o ponto do recorte ou outro com score >= 0.98
+    # (elementos repetidos da interface)
+    from PIL import Image
+    with Image.open(image_path) as image:
+        frame = np.asarray(image.convert('RGB'))[:search[0], :search[1]]
+    rng = random.Random(seed)
+    results = []
+    for height, width in sizes:
+        times = []
+        hits = 0
+        while len(times) < trials:
+            y = rng.randrange(frame.shape[0] - height)
+            x = rng.randrange(frame.shape[1] - width)
+            patch = frame[y:y + height, x:x + width]
+            if to_gray(patch).std() < 5:
+                continue
+            prepared = PreparedTemplate(patch)
+            start = time.perf_counter()
+            score, point = match_template(prepared, frame)
+            times.append((time.perf_counter() - start) * 1000)
+            hits += point == (x, y) or score >= 0.98
+        results.append({
+            'size': [height, width], 'levels': prepared.levels, 'phases': bool(prepared.phases),
+            'p50_ms': percentile(times, 50), 'p90_ms': percentile(times, 90), 'hits': hits, 'trials': trials,
+        })
+    return {'image': image_path, 'search': list(frame.shape[:2]), 'templates': results}
+
+
+def format_template_report(result):
+    lines = [f"templates em {result['image']} ({result['search'][1]}x{result['search'][0]}):"]
+    for entry in result['templates']:
+        height, width = entry['size']
+        search = "fases" if entry['phases'] else f"{entry['levels']} níveis"
+        lines.append(
+            f"  {width}x{height} ({search}): p50 {entry['p50_ms']:.1f}  p90 {entry['p90_ms']:.1f} ms  "
+            f"acertos {entry['hits']}/{entry['trials']}"
+        )
+    return "\n".join(lines)
+
+
+def format_report(result):
+    latency = result['latency_ms']
+
+    def ms(value):
+        return f"{value:.1f}" if value is not None else "-"
+
+    return "\n".join([
+        f"{result['profile']}: {result['tasks']} tasks ({result['color_tasks']} de cor, "
+        f"{result['skipped_tasks']} ignoradas), {result['duration_s']:.1f} s",
+        f"  latência (ms): p50 {ms(latency['p50'])}  p90 {ms(latency['p90'])}  "
+        f"p99 {ms(latency['p99'])}  máx {ms(latency['max'])}  "
+        f"({result['triggers']} disparos, {result['missed']} perdidos)",
+        f"  frames/s {result['frames_per_s']:.1f}  avaliações/s {result['evaluations_per_s']:.1f}  "
+        f"frames inalterados {result['unchanged_frames']}",
+        f"  CPU por frame {ms(result['cpu_ms_per_frame'])} ms  threads (pico) {result['thread_peak']}  "
+        f"cliques {result['clicks']}",
+    ] + [
+        f"  {stage}: p50 {ms(stats['p50'])}  p95 {ms(stats['p95'])} ms"
+        for stage, stats in sorted(result['stages'].items())
+    ])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark headless do caminho de disparo das tasks")
+    parser.add_argument('profiles', nargs='*', default=DEFAULT_PROFILES)
+    parser.add_argument('--duration', type=float, default=10.0)
+    parser.add_argument('--period', type=float, default=1.0, help="Intervalo entre ativações de cada condição (s)")
+    parser.add_argument('--hold', type=float, default=0.3, help="Tempo que cada condição fica ativa (s)")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--capture-mode', choices=('points', 'area'), default='points')
+    parser.add_argument('--click-only', action='store_true', help="Troca as ações das tasks por um clique único")
+    parser.add_argument('--output', help="Acrescenta os resultados em JSON (uma linha por perfil) neste arquivo")
+    parser.add_argument('--templates', nargs='?', const=DEFAULT_TEMPLATE_IMAGE, metavar='IMAGEM',
+                        help="Mede a busca de templates (patches pequenos e grandes) em vez dos perfis")
+    args = parser.parse_args()
+    script_dir = os.path.dirname(os.path.realpath(__file__))
+    if args.templates:
+        path = args.templates if os.path.exists(args.templates) else os.path.join(script_dir, args.templates)
+        result = run_template_benchmark(path, seed=args.seed)
+        print(format_template_report(result))
+        if args.output:
+            result['timestamp'] = time.time()
+            with open(args.output, 'a') as file:
+                file.write(json.dumps(result) + "\n")
+        return
+    for profile in args.profiles:
+        path = profile if os.path.exists(profile) else os.path.join(script_dir, profile)
+        result = run_benchmark(path, args.duration, args.period, args.hold, args.seed, args.capture_mode, args.click_only)
+        print(format_report(result))
+        if args.output:
+            result['timestamp'] = time.time()
+            with open(args.output, 'a') as file:
+                file.write(json.dumps(result) + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,547 @@
+import ctypes
+import ctypes.util
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from conditions import ColorConditionEvaluator
+from eventlog import ErrorReporter
+from templates import TemplateCache, match_template
+
+
+class CaptureBackend:
+    # Interface de captura: grab(region) retorna um array HxWx3 (uint8, RGB) da
+    # região (x, y, width, height) em coordenadas de tela, ou da tela toda se None.
+    name = None
+
+    def grab(self, region=None):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class PyAutoGuiBackend(CaptureBackend):
+    # Caminho original, via pyautogui/PIL
+    name = 'pyautogui'
+
+    def __init__(self):
+        import pyautogui
+        self.pyautogui = pyautogui
+
+    def grab(self, region=None):
+        if region:
+            screenshot = self.pyautogui.screenshot(region=tuple(region))
+        else:
+            screenshot = self.pyautogui.screenshot()
+        return np.asarray(screenshot.convert('RGB'))
+
+
+class _XImage(ctypes.Structure):
+    # Só os campos iniciais de XImage (Xlib.h); o resto nunca é acessado
+    _fields_ = [
+        ('width', ctypes.c_int),
+        ('height', ctypes.c_int),
+        ('xoffset', ctypes.c_int),
+        ('format', ctypes.c_int),
+        ('data', ctypes.c_void_p),
+        ('byte_order', ctypes.c_int),
+        ('bitmap_unit', ctypes.c_int),
+        ('bitmap_bit_order', ctypes.c_int),
+        ('bitmap_pad', ctypes.c_int),
+        ('depth', ctypes.c_int),
+        ('bytes_per_line', ctypes.c_int),
+        ('bits_per_pixel', ctypes.c_int),
+    ]
+
+
+class _XShmSegmentInfo(ctypes.Structure):
+    _fields_ = [
+        ('shmseg', ctypes.c_ulong),
+        ('shmid', ctypes.c_int),
+        ('shmaddr', ctypes.c_void_p),
+        ('readOnly', ctypes.c_int),
+    ]
+
+
+class XShmBackend(CaptureBackend):
+    # Captura X11 por memória compartilhada (MIT-SHM): o servidor X escreve
+    # direto num segmento shm reaproveitado entre frames, sem PIL nem subprocessos.
+    name = 'xshm'
+
+    ZPixmap = 2
+    IPC_PRIVATE = 0
+    IPC_CREAT = 0o1000
+    IPC_RMID = 0
+    AllPlanes = 0xFFFFFFFF
+    SHMAT_FAILED = ctypes.c_void_p(-1).value  # (void *) -1
+
+    def __init__(self, display=None, max_images=8):
+        if not sys.platform.startswith('linux'):
+            raise OSError("MIT-SHM só está disponível no X11/Linux")
+        libx11 = ctypes.util.find_library('X11')
+        libxext = ctypes.util.find_library('Xext')
+        if not libx11 or not libxext:
+            raise OSError("libX11/libXext não encontradas")
+        self.xlib = ctypes.CDLL(libx11)
+        self.xext = ctypes.CDLL(libxext)
+        self.libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        self.setup_prototypes()
+
+        display_name = (display or os.environ.get('DISPLAY', '')).encode() or None
+        self.display = self.xlib.XOpenDisplay(display_name)
+        if not self.display:
+            raise OSError("Não foi possível abrir o display X11")
+        if not self.xext.XShmQueryExtension(self.display):
+            self.xlib.XCloseDisplay(self.display)
+            raise OSError("Servidor X sem extensão MIT-SHM")
+        screen = self.xlib.XDefaultScreen(self.display)
+        self.root = self.xlib.XDefaultRootWindow(self.display)
+        self.visual = self.xlib.XDefaultVisual(self.display, screen)
+        self.depth = self.xlib.XDefaultDepth(self.display, screen)
+        self.screen_size = (
+            self.xlib.XDisplayWidth(self.display, screen),
+            self.xlib.XDisplayHeight(self.display, screen)
+        )
+        # (width, height) -> (ximage, shminfo), do menos ao mais usado. Cada
+        # tamanho de região tem um segmento; os mais antigos são liberados.
+        self.images = OrderedDict()
+        self.max_images = max_images
+        self.lock = threading.Lock()
+
+    def setup_prototypes(self):
+        xlib, xext, libc = self.xlib, self.xext, self.libc
+        xlib.XOpenDisplay.restype = ctypes.c_void_p
+        xlib.XOpenDisplay.argtypes = [ctypes.c_char_p]
+        xlib.XCloseDisplay.argtypes = [ctypes.c_void_p]
+        xlib.XDefaultScreen.argtypes = [ctypes.c_void_p]
+        xlib.XDefaultRootWindow.restype = ctypes.c_ulong
+        xlib.XDefaultRootWindow.argtypes = [ctypes.c_void_p]
+        xlib.XDefaultVisual.restype = ctypes.c_void_p
+        xlib.XDefaultVisual.argtypes = [ctypes.c_void_p, ctypes.c_int]
+        xlib.XDefaultDepth.argtypes = [ctypes.c_void_p, ctypes.c_int]
+        xlib.XDisplayWidth.argtypes = [ctypes.c_void_p, ctypes.c_int]
+        xlib.XDisplayHeight.argtypes = [ctypes.c_void_p, ctypes.c_int]
+        xlib.XSync.argtypes = [ctypes.c_void_p, ctypes.c_int]
+        xlib.XFree.argtypes = [ctypes.c_void_p]
+        xext.XShmQueryExtension.argtypes = [ctypes.c_void_p]
+        xext.XShmCreateImage.restype = ctypes.POINTER(_XImage)
+        xext.XShmCreateImage.argtypes = [
+            ctypes.c_void_p, ctypes.c_void_p, ctypes.c_uint, ctypes.c_int, ctypes.c_void_p,
+            ctypes.POINTER(_XShmSegmentInfo), ctypes.c_uint, ctypes.c_uint
+        ]
+        xext.XShmAttach.restype = ctypes.c_int
+        xext.XShmAttach.argtypes = [ctypes.c_void_p, ctypes.POINTER(_XShmSegmentInfo)]
+        xext.XShmDetach.argtypes = [ctypes.c_void_p, ctypes.POINTER(_XShmSegmentInfo)]
+        xext.XShmGetImage.argtypes = [
+            ctypes.c_void_p, ctypes.c_ulong, ctypes.POINTER(_XImage), ctypes.c_int, ctypes.c_int, ctypes.c_ulong
+        ]
+        libc.shmget.restype = ctypes.c_int
+        libc.shmget.argtypes = [ctypes.c_int, ctypes.c_size_t, ctypes.c_int]
+        libc.shmat.restype = ctypes.c_void_p
+        libc.shmat.argtypes = [ctypes.c_int, ctypes.c_void_p, ctypes.c_int]
+        libc.shmdt.argtypes = [ctypes.c_void_p]
+        libc.shmctl.argtypes = [ctypes.c_int, ctypes.c_int, ctypes.c_void_p]
+
+    def create_image(self, width, height):
+        shminfo = _XShmSegmentInfo()
+        ximage = self.xext.XShmCreateImage(
+            self.display, self.visual, self.depth, self.ZPixmap, None, ctypes.byref(shminfo), width, height
+        )
+        if not ximage:
+            raise OSError("XShmCreateImage falhou")
+        if ximage.contents.bits_per_pixel != 32:
+            self.xlib.XFree(ctypes.cast(ximage, ctypes.c_void_p))
+            raise OSError("Formato de imagem X11 não suportado (esperado 32 bpp)")
+        size = ximage.contents.bytes_per_line * height
+        shminfo.shmid = self.libc.shmget(self.IPC_PRIVATE, size, self.IPC_CREAT | 0o600)
+        if shminfo.shmid < 0:
+            errno = ctypes.get_errno()
+            self.xlib.XFree(ctypes.cast(ximage, ctypes.c_void_p))
+            raise OSError(errno, "shmget falhou")
+        address = self.libc.shmat(shminfo.shmid, None, 0)
+        # O segmento some sozinho quando o último processo desanexar
+        self.libc.shmctl(shminfo.shmid, self.IPC_RMID, None)
+        if address is None or address == self.SHMAT_FAILED:
+            errno = ctypes.get_errno()
+            self.xlib.XFree(ctypes.cast(ximage, ctypes.c_void_p))
+            raise OSError(errno, "shmat falhou")
+        shminfo.shmaddr = address
+        ximage.contents.data = address
+        shminfo.readOnly = 0
+        if not self.xext.XShmAttach(self.display, ctypes.byref(shminfo)):
+            self.libc.shmdt(address)
+            ximage.contents.data = None
+            self.xlib.XFree(ctypes.cast(ximage, ctypes.c_void_p))
+            raise OSError("XShmAttach falhou")
+        self.xlib.XSync(self.display, 0)
+        return ximage, shminfo
+
+    def destroy_image(self, ximage, shminfo):
+        self.xext.XShmDetach(self.display, ctypes.byref(shminfo))
+        self.xlib.XSync(self.display, 0)
+        self.libc.shmdt(shminfo.shmaddr)
+        # data aponta para o segmento já desanexado: só a estrutura é liberada
+        ximage.contents.data = None
+        self.xlib.XFree(ctypes.cast(ximage, ctypes.c_void_p))
+
+    def grab(self, region=None):
+        if region:
+            x, y, width, height = region
+        else:
+            x, y = 0, 0
+            width, height = self.screen_size
+        # Regiões fora da tela geram BadMatch no X (que encerra o processo):
+        # captura só a interseção e preenche o resto com preto
+        left, top = max(x, 0), max(y, 0)
+        right = min(x + width, self.screen_size[0])
+        bottom = min(y + height, self.screen_size[1])
+        if (left, top, right, bottom) != (x, y, x + width, y + height):
+            frame = np.zeros((height, width, 3), dtype=np.uint8)
+            if right > left and bottom > top:
+                frame[top - y:bottom - y, left - x:right - x] = self.grab((left, top, right - left, bottom - top))
+            return frame
+        with self.lock:
+            if not self.display:
+                raise OSError("Backend de captura já foi fechado")
+            key = (width, height)
+            if key in self.images:
+                self.images.move_to_end(key)
+            else:
+                while len(self.images) >= self.max_images:
+                    self.destroy_image(*self.images.popitem(last=False)[1])
+                self.images[key] = self.create_image(width, height)
+            ximage, shminfo = self.images[key]
+            if not self.xext.XShmGetImage(self.display, self.root, ximage, x, y, self.AllPlanes):
+                raise OSError("XShmGetImage falhou")
+            stride = ximage.contents.bytes_per_line
+            buffer = (ctypes.c_ubyte * (stride * height)).from_address(shminfo.shmaddr)
+            pixels = np.frombuffer(buffer, dtype=np.uint8).reshape(height, stride)
+            # BGRX -> RGB, copiando para fora do segmento compartilhado
+            return pixels[:, :width * 4].reshape(height, width, 4)[:, :, 2::-1].copy()
+
+    def close(self):
+        with self.lock:
+            for ximage, shminfo in self.images.values():
+                self.destroy_image(ximage, shminfo)
+            self.images = OrderedDict()
+            if self.display:
+                self.xlib.XCloseDisplay(self.display)
+                self.display = None
+
+
+class SyntheticBackend(CaptureBackend):
+    # Reproduz frames de arquivos de imagem ou arrays NumPy, sem display.
+    # Cada frame representa a tela inteira; grab() recorta a região pedida.
+    name = 'synthetic'
+
+    def __init__(self, frames, loop=True, advance_on_grab=False):
+        self.frames = [self.load_frame(frame) for frame in frames]
+        if not self.frames:
+            raise ValueError("SyntheticBackend precisa de pelo menos um frame")
+        self.loop = loop
+        self.advance_on_grab = advance_on_grab
+        self.index = 0
+        self.grab_count = 0
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def load_frame(frame):
+        if isinstance(frame, (str, os.PathLike)):
+            from PIL import Image
+            with Image.open(frame) as image:
+                return np.asarray(image.convert('RGB'))
+        frame = np.asarray(frame, dtype=np.uint8)
+        return frame[:, :, :3]
+
+    def set_frame(self, index):
+        with self.lock:
+            self.index = index % len(self.frames) if self.loop else min(index, len(self.frames) - 1)
+
+    def advance(self):
+        self.set_frame(self.index + 1)
+
+    def grab(self, region=None):
+        with self.lock:
+            frame = self.frames[self.index]
+            self.grab_count += 1
+        if self.advance_on_grab:
+            self.advance()
+        if not region:
+            return frame.copy()
+        x, y, width, height = region
+        crop = np.zeros((height, width, 3), dtype=np.uint8)
+        source = frame[max(y, 0):y + height, max(x, 0):x + width]
+        crop[max(-y, 0):max(-y, 0) + source.shape[0], max(-x, 0):max(-x, 0) + source.shape[1]] = source
+        return crop
+
+
+class LazyCaptureBackend(CaptureBackend):
+    # Adia a criação (e a sondagem do display) do backend real até o primeiro grab
+    def __init__(self, backend_name='auto', **kwargs):
+        self.backend_name = backend_name
+        self.kwargs = kwargs
+        self.backend = None
+        self.lock = threading.Lock()
+
+    def get(self):
+        with self.lock:
+            if self.backend is None:
+                self.backend = create_capture_backend(self.backend_name, **self.kwargs)
+            return self.backend
+
+    def grab(self, region=None):
+        return self.get().grab(region)
+
+    def close(self):
+        with self.lock:
+            backend, self.backend = self.backend, None
+        if backend is not None:
+            backend.close()
+
+
+CAPTURE_BACKENDS = {
+    'pyautogui': PyAutoGuiBackend,
+    'xshm': XShmBackend,
+    'synthetic': SyntheticBackend,
+}
+
+
+def create_capture_backend(name='auto', **kwargs):
+    # 'auto' tenta o backend nativo e cai para o pyautogui se não estiver disponível
+    if name == 'auto':
+        try:
+            backend = XShmBackend(**kwargs)
+        except OSError as e:
+            print(f"Captura MIT-SHM indisponível ({e}); usando pyautogui.")
+            return PyAutoGuiBackend()
+        try:
+            # Sonda o segmento compartilhado (shmget/shmat/XShmAttach) antes de usar
+            backend.grab((0, 0, 1, 1))
+            return backend
+        except OSError as e:
+            backend.close()
+            print(f"Captura MIT-SHM indisponível ({e}); usando pyautogui.")
+            return PyAutoGuiBackend()
+    return CAPTURE_BACKENDS[name](**kwargs)
+
+
+def plan_capture_regions(points, merge_distance=48, bounds=None):
+    # Calcula as menores caixas (x, y, width, height) que cobrem os pontos observados.
+    # Pontos próximos (até merge_distance px) dividem uma caixa; pontos distantes
+    # viram capturas pequenas separadas. bounds limita os pontos à área selecionada.
+    boxes = []
+    for x, y in sorted(set(tuple(p) for p in points)):
+        if bounds:
+            bx, by, bw, bh = bounds
+            if not (bx <= x < bx + bw and by <= y < by + bh):
+                continue
+        boxes.append([x, y, x + 1, y + 1])  # left, top, right, bottom (exclusivo)
+    merged = True
+    while merged:
+        merged = False
+        result = []
+        for box in boxes:
+            for other in result:
+                gap_x = max(other[0] - box[2], box[0] - other[2], 0)
+                gap_y = max(other[1] - box[3], box[1] - other[3], 0)
+                if gap_x <= merge_distance and gap_y <= merge_distance:
+                    other[0] = min(other[0], box[0])
+                    other[1] = min(other[1], box[1])
+                    other[2] = max(other[2], box[2])
+                    other[3] = max(other[3], box[3])
+                    merged = True
+                    break
+            else:
+                result.append(box)
+        boxes = result
+    return [(left, top, right - left, bottom - top) for left, top, right, bottom in boxes]
+
+
+class FrameCapture:
+    # Captura compartilhada: o scheduler pede um frame por tick para todas as
+    # tasks de cor devidas, em vez de cada task capturar a tela sozinha.
+    def __init__(self, region_provider, backend, capture_mode='points', merge_distance=48, origin_provider=None, metrics=None, errors=None):
+        self.region_provider = region_provider  # Retorna (x, y, width, height) ou None
+        self.backend = backend
+        # Posições e regiões são relativas à origem dada por origin_provider (o
+        # canto da janela alvo); só a chamada ao backend usa coordenadas de tela
+        self.origin_provider = origin_provider
+        self.metrics = metrics  # StageMetrics opcional: capture_ms / evaluate_ms
+        self.errors = errors or ErrorReporter()
+        # 'points': captura só as caixas que cobrem as posições observadas
+        # 'area': captura a área selecionada inteira (ou a tela toda)
+        self.capture_mode = capture_mode
+        self.merge_distance = merge_distance
+        self.regions = []  # Lista de (origem, array) do último frame
+        self.frame_id = 0
+        self.tasks = []
+        self.evaluator = None
+        self.plans = {}  # Posições das tasks devidas -> caixas a capturar
+        self.profile = None  # Perfil atual; chave do cache de templates
+        self.template_cache = TemplateCache()
+        # Detecção de mudança: se os pixels observados não mudaram desde o último
+        # frame, o resultado anterior é reaproveitado sem reavaliar as condições
+        self.last_samples = None  # Último valor lido em cada posição distinta
+        self.last_results = {}
+        # Tasks com histerese ligadas; sobrevive à remontagem do avaliador
+        self.latched = set()
+        self.template_state = {}  # task -> (frame, resultado) da última avaliação
+        self.changed = True
+        self.changed_tasks = set()
+        self.skipped_evaluations = 0
+        self.lock = threading.Lock()
+
+    def set_profile(self, profile):
+        with self.lock:
+            previous, self.profile = self.profile, profile
+        if previous != profile:
+            self.template_cache.clear(previous)
+
+    def invalidate(self):
+        # Chamado quando uma task em execução é editada ou a área muda
+        with self.lock:
+            self.evaluator = None
+            self.reset_state()
+            self.template_state = {}
+
+    def reset_state(self):
+        # Planos e amostras dependem do avaliador e da área: recomeçam do zero
+        self.plans = {}
+        self.last_samples = None
+        self.last_results = {}
+
+    def prime(self, tasks):
+        # Monta o avaliador das tasks de cor/compostas antes do primeiro tick (ao
+        # ligar/desligar tasks), com a mesma lista que o scheduler vai entregar
+        evaluator = ColorConditionEvaluator.from_tasks(tasks)
+        with self.lock:
+            self.tasks = list(tasks)
+            self.evaluator = evaluator
+            self.reset_state()
+            # Só tasks desligadas perdem a trava da histerese
+            self.latched &= set(tasks)
+
+    def evaluate(self, tasks, due=None):
+        # tasks: todas as tasks ativas (o avaliador fica estável); due: as devidas
+        # neste tick (None = todas). Só as posições das devidas são capturadas e
+        # só elas recebem resultado: {task: bool}. changed_tasks guarda as devidas
+        # cujos pixels (ou região de template) mudaram desde a última leitura.
+        area = self.region_provider()
+        color_tasks = [task for task in tasks if task.condition_type in ('color', 'compound')]
+        due = set(tasks) if due is None else set(due)
+        self.changed_tasks = set()
+        due_colors = [task for task in color_tasks if task in due]
+        results = self.evaluate_colors(color_tasks, due_colors, area) if due_colors else {}
+        for task in tasks:
+            if task.condition_type == 'template' and task in due:
+                try:
+                    results[task] = self.evaluate_template(task, area)
+                    self.errors.clear(f"template:{task.name}")
+                except OSError as e:
+                    self.errors.error(f"template:{task.name}", f"Erro no template da task {task.name}: {e}")
+                    results[task] = False
+        self.changed = bool(self.changed_tasks)
+        return results
+
+    def evaluate_template(self, task, area):
+        start = time.perf_counter()
+        frame = self.backend.grab(self.to_screen(task.search_region or area))
+        captured = time.perf_counter()
+        self.record('capture_ms', captured - start, task)
+        previous = self.template_state.get(task)
+        if previous is not None and np.array_equal(previous[0], frame):
+            self.skipped_evaluations += 1
+            return previous[1]
+        self.changed_tasks.add(task)
+        prepared = self.template_cache.get(self.profile, task.template_path)
+        score, _ = match_template(prepared, frame)
+        result = score >= task.condition_value
+        self.record('evaluate_ms', time.perf_counter() - captured, task)
+        self.template_state[task] = (frame, result)
+        return result
+
+    def evaluate_colors(self, tasks, due, area):
+        # Captura só as caixas das posições das tasks devidas e avalia todas as
+        # condições de uma vez (a comparação vetorizada custa microssegundos)
+        with self.lock:
+            if self.evaluator is None or self.tasks != tasks:
+                self.tasks = list(tasks)
+                self.evaluator = ColorConditionEvaluator.from_tasks(self.tasks)
+                self.reset_state()
+            evaluator = self.evaluator
+            due = [task for task in due if task in evaluator.task_rows]
+            if not due:
+                return {}
+            rows = np.unique(np.concatenate([evaluator.task_rows[task] for task in due]))
+            key = rows.tobytes()
+            plan = self.plans.get(key)
+            if plan is None:
+                if len(self.plans) >= 64:
+                    self.plans = {}
+                plan = self.plans[key] = self.plan_regions(evaluator, area, rows)
+            if self.last_samples is None:
+                # -2: nunca lido (diferente de -1, fora da captura)
+                self.last_samples = np.full((len(evaluator.xs), 3), -2, dtype=np.int16)
+            last_samples = self.last_samples
+        start = time.perf_counter()
+        regions = self.grab(plan)
+        captured = time.perf_counter()
+        self.record('capture_ms', captured - start)
+        samples, valid = evaluator.sample_regions(regions)
+        samples[~valid] = -1
+        # Mudança por task: só as posições que ela lê contam
+        row_changed = np.any(samples != last_samples, axis=1)
+        last_samples[rows] = samples[rows]
+        changed = [task for task in due if row_changed[evaluator.task_rows[task]].any()]
+        self.changed_tasks.update(changed)
+        if not changed and all(task in self.last_results for task in due):
+            self.skipped_evaluations += 1
+            return {task: self.last_results[task] for task in due}
+        matches = evaluator.evaluate_samples(samples, valid).tolist()
+        results = evaluator.task_results(matches, self.latched, evaluator.condition_valid(valid).tolist(), due)
+        self.record('evaluate_ms', time.perf_counter() - captured)
+        self.last_results.update(results)
+        return results
+
+    def record(self, stage, seconds, task=None):
+        if self.metrics is not None:
+            self.metrics.record(stage, seconds * 1000, task.name if task is not None else None)
+
+    def grab(self, plan):
+        regions = []
+        for region in plan:
+            origin = (region[0], region[1]) if region else (0, 0)
+            regions.append((origin, self.backend.grab(self.to_screen(region))))
+        with self.lock:
+            self.regions = regions
+            self.frame_id += 1
+        return regions
+
+    def to_screen(self, region):
+        if region is None or self.origin_provider is None:
+            return region
+        left, top = self.origin_provider()
+        return (region[0] + left, region[1] + top, region[2], region[3])
+
+    def plan_regions(self, evaluator, area, rows=None):
+        if self.capture_mode == 'area':
+            return [area]
+        # Em vez da área inteira, só as caixas em volta das posições observadas
+        # (rows: índices das posições distintas das tasks devidas)
+        positions = evaluator.distinct_positions if rows is None else [evaluator.distinct_positions[i] for i in rows]
+        return plan_capture_regions(positions, self.merge_distance, area)
+
+    def get_pixel(self, position):
+        with self.lock:
+            regions = self.regions
+        x, y = position
+        for (origin_x, origin_y), frame in regions:
+            height, width = frame.shape[:2]
+            if 0 <= x - origin_x < width and 0 <= y - origin_y < height:
+                return tuple(int(c) for c in frame[y - origin_y, x - origin_x, :3])
+        return None
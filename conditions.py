@@ -0,0 +1,265 @@
+import time
+
+import numpy as np
+
+# exact: igualdade RGB; euclidean: distância RGB; channel: delta máximo por canal;
+# hue: janela de matiz HSV em graus (pixels cinza não têm matiz e nunca casam)
+TOLERANCE_MODES = ('exact', 'euclidean', 'channel', 'hue')
+
+
+def rgb_to_hue(colors):
+    # Matiz HSV vetorizado, em graus; retorna (hue, chroma > 0)
+    colors = colors.astype(np.float32)
+    r, g, b = colors[:, 0], colors[:, 1], colors[:, 2]
+    maximum = colors.max(axis=1)
+    chroma = maximum - colors.min(axis=1)
+    safe = np.where(chroma == 0, 1, chroma)
+    hue = np.where(
+        maximum == r, ((g - b) / safe) % 6,
+        np.where(maximum == g, (b - r) / safe + 2, (r - g) / safe + 4)
+    ) * 60
+    return hue, chroma > 0
+
+
+class ToleranceGroup:
+    # Tabelas pré-calculadas para todas as condições com o mesmo modo e limiar
+    def __init__(self, mode, tolerance, indices, colors):
+        if mode not in TOLERANCE_MODES:
+            raise ValueError(f"Modo de tolerância desconhecido: {mode}")
+        self.mode = mode
+        self.tolerance = tolerance
+        self.indices = np.asarray(indices, dtype=np.intp)
+        self.colors = colors[self.indices]
+        if mode == 'euclidean':
+            self.threshold = float(tolerance) ** 2
+        elif mode == 'hue':
+            self.hues, self.chromatic = rgb_to_hue(self.colors)
+
+    def match(self, values):
+        if self.mode == 'exact':
+            return np.all(values == self.colors, axis=1)
+        if self.mode == 'channel':
+            return np.all(np.abs(values - self.colors) <= self.tolerance, axis=1)
+        if self.mode == 'euclidean':
+            diff = (values - self.colors).astype(np.int32)
+            return np.einsum('ij,ij->i', diff, diff) <= self.threshold
+        hues, chromatic = rgb_to_hue(values)
+        delta = np.abs(hues - self.hues)
+        delta = np.minimum(delta, 360 - delta)
+        return (delta <= self.tolerance) & chromatic & self.chromatic
+
+
+def compile_condition_tree(tree, leaves):
+    # Converte a árvore do JSON em tuplas e acumula as folhas (checagens de pixel)
+    # em leaves; cada folha vira ('pixel', índice em leaves).
+    #   {"all": [...]}, {"any": [...]}, {"not": {...}},
+    #   {"pixel": [x, y], "color": [r, g, b], "tolerance_mode": ..., "tolerance": ...}
+    if not isinstance(tree, dict) or len(tree.keys() & {'all', 'any', 'not', 'pixel'}) != 1:
+        raise ValueError(f"Nó de condição inválido: {tree}")
+    if 'all' in tree or 'any' in tree:
+        operator = 'all' if 'all' in tree else 'any'
+        return (operator, [compile_condition_tree(child, leaves) for child in tree[operator]])
+    if 'not' in tree:
+        return ('not', compile_condition_tree(tree['not'], leaves))
+    if 'color' not in tree:
+        raise ValueError(f"Checagem de pixel sem cor: {tree}")
+    leaves.append((
+        tuple(tree['pixel']),
+        tuple(tree['color']),
+        (tree.get('tolerance_mode', 'exact'), tree.get('tolerance', 0))
+    ))
+    return ('pixel', len(leaves) - 1)
+
+
+def evaluate_condition_tree(node, leaf_results):
+    # Avaliação com curto-circuito sobre os resultados das folhas já calculados
+    operator, operand = node
+    if operator == 'pixel':
+        return bool(leaf_results[operand])
+    if operator == 'not':
+        return not evaluate_condition_tree(operand, leaf_results)
+    if operator == 'all':
+        return all(evaluate_condition_tree(child, leaf_results) for child in operand)
+    return any(evaluate_condition_tree(child, leaf_results) for child in operand)
+
+
+def shift_leaves(node, offset):
+    operator, operand = node
+    if operator == 'pixel':
+        return (operator, operand + offset)
+    if operator == 'not':
+        return (operator, shift_leaves(operand, offset))
+    return (operator, [shift_leaves(child, offset) for child in operand])
+
+
+class ColorConditionEvaluator:
+    # Avalia todas as condições de cor de uma vez: as posições distintas viram
+    # arrays de índices e o frame inteiro é comparado com um único fancy-indexing.
+    # Funciona com qualquer array HxWx3 (ou HxWx4), inclusive sintético.
+    def __init__(self, positions=(), colors=(), tolerances=None):
+        positions = [tuple(p) for p in positions]
+        self.distinct_positions = sorted(set(positions))
+        index = {pos: i for i, pos in enumerate(self.distinct_positions)}
+        self.xs = np.array([p[0] for p in self.distinct_positions], dtype=np.intp)
+        self.ys = np.array([p[1] for p in self.distinct_positions], dtype=np.intp)
+        self.position_index = np.array([index[p] for p in positions], dtype=np.intp)
+        self.colors = np.array([tuple(c)[:3] for c in colors], dtype=np.int16).reshape(-1, 3)
+        # Condições com o mesmo (modo, limiar) compartilham um ToleranceGroup
+        if tolerances is None:
+            tolerances = [('exact', 0)] * len(positions)
+        grouped = {}
+        for i, (mode, tolerance) in enumerate(tolerances):
+            if mode == 'exact' or not tolerance:
+                mode, tolerance = 'exact', 0
+            grouped.setdefault((mode, tolerance), []).append(i)
+        self.groups = [
+            ToleranceGroup(mode, tolerance, indices, self.colors)
+            for (mode, tolerance), indices in grouped.items()
+        ]
+        self.releases = {}  # Preenchido por from_tasks
+        self.leaf_ranges = {}
+        self.task_rows = {}
+
+    @classmethod
+    def from_tasks(cls, tasks):
+        # Tasks 'color' viram uma condição cada; tasks 'compound' contribuem com
+        # todas as folhas da árvore, avaliadas no mesmo passo vetorizado
+        positions, colors, tolerances = [], [], []
+        selected = []
+        trees = {}
+        releases = {}  # task -> índice da condição "off" (histerese)
+        leaf_ranges = {}  # task composta -> (primeira, última + 1) condição das folhas
+        condition_ranges = {}  # task -> (primeira, última + 1) condição da task
+        for task in tasks:
+            start = len(positions)
+            if task.condition_type == 'color':
+                if task.condition_position is None or task.condition_value is None:
+                    continue
+                trees[task] = ('pixel', len(positions))
+                positions.append(task.condition_position)
+                colors.append(task.condition_value)
+                tolerances.append((task.tolerance_mode, task.tolerance))
+                off_tolerance = task.off_tolerance
+                if off_tolerance is not None and off_tolerance > task.tolerance:
+                    # Mesma posição com o limiar mais largo: a condição liga com
+                    # tolerance e só desliga quando sai de off_tolerance
+                    mode = task.tolerance_mode if task.tolerance_mode != 'exact' else 'channel'
+                    releases[task] = len(positions)
+                    positions.append(task.condition_position)
+                    colors.append(task.condition_value)
+                    tolerances.append((mode, off_tolerance))
+            elif task.condition_type == 'compound' and task.condition_value:
+                leaves = []
+                tree = compile_condition_tree(task.condition_value, leaves)
+                offset = len(positions)
+                trees[task] = shift_leaves(tree, offset)
+                leaf_ranges[task] = (offset, offset + len(leaves))
+                for position, color, tolerance in leaves:
+                    positions.append(position)
+                    colors.append(color)
+                    tolerances.append(tolerance)
+            else:
+                continue
+            condition_ranges[task] = (start, len(positions))
+            selected.append(task)
+        evaluator = cls(positions, colors, tolerances)
+        evaluator.tasks = selected
+        evaluator.trees = trees
+        evaluator.releases = releases
+        evaluator.leaf_ranges = leaf_ranges
+        # Posições distintas lidas por cada task: capturar só as das tasks devidas
+        # e detectar mudança por task
+        evaluator.task_rows = {
+            task: np.unique(evaluator.position_index[start:end]) for task, (start, end) in condition_ranges.items()
+        }
+        return evaluator
+
+    def task_results(self, matches, latched=None, valid=None, tasks=None):
+        # {task: bool} a partir do array de resultados por condição. latched é o
+        # conjunto de tasks com histerese ligadas; fica com quem chama (o avaliador
+        # é remontado a cada start/stop/edição) e é atualizado aqui. valid diz,
+        # por condição, se o pixel foi amostrado. tasks limita o cálculo (e a
+        # atualização da histerese) às tasks devidas; None = todas.
+        if latched is None:
+            latched = set()
+        results = {}
+        for task in self.tasks if tasks is None else tasks:
+            on = evaluate_condition_tree(self.trees[task], matches)
+            leaf_range = self.leaf_ranges.get(task)
+            if valid is not None and leaf_range and not all(valid[leaf_range[0]:leaf_range[1]]):
+                # Folha não amostrada não é "falsa": um NOT sobre ela dispararia.
+                # A condição composta inteira fica sem match.
+                on = False
+            release = self.releases.get(task)
+            if release is not None:
+                # Histerese: uma task ligada continua ligada enquanto estiver dentro de off_tolerance
+                on = on or (task in latched and bool(matches[release]))
+                if on:
+                    latched.add(task)
+                else:
+                    latched.discard(task)
+            results[task] = on
+        return results
+
+    def __len__(self):
+        return len(self.position_index)
+
+    def sample(self, frame, origin=(0, 0)):
+        # Lê uma vez cada posição distinta; posições fora do frame ficam inválidas
+        return self.sample_regions([(origin, frame)])
+
+    def sample_regions(self, regions):
+        # regions: lista de (origem, array) vinda do planejador de captura
+        samples = np.zeros((len(self.xs), 3), dtype=np.int16)
+        valid = np.zeros(len(self.xs), dtype=bool)
+        for origin, frame in regions:
+            xs = self.xs - origin[0]
+            ys = self.ys - origin[1]
+            height, width = frame.shape[:2]
+            inside = (xs >= 0) & (xs < width) & (ys >= 0) & (ys < height) & ~valid
+            samples[inside] = frame[ys[inside], xs[inside], :3]
+            valid |= inside
+        return samples, valid
+
+    def evaluate(self, frame, origin=(0, 0)):
+        # Retorna um array booleano com uma entrada por condição, na ordem de entrada
+        return self.evaluate_regions([(origin, frame)])
+
+    def evaluate_regions(self, regions):
+        if not len(self):
+            return np.zeros(0, dtype=bool)
+        samples, valid = self.sample_regions(regions)
+        return self.evaluate_samples(samples, valid)
+
+    def condition_valid(self, valid):
+        # Validade por condição a partir da validade por posição distinta
+        return valid[self.position_index]
+
+    def evaluate_samples(self, samples, valid):
+        values = samples[self.position_index]
+        if len(self.groups) == 1:
+            matches = self.groups[0].match(values)
+        else:
+            matches = np.zeros(len(self), dtype=bool)
+            for group in self.groups:
+                matches[group.indices] = group.match(values[group.indices])
+        return matches & valid[self.position_index]
+
+def benchmark(num_conditions=200, frame_size=(779, 442), repeat=1000, seed=0):
+    # Mede o custo por frame do avaliador usando um frame sintético
+    rng = np.random.default_rng(seed)
+    height, width = frame_size
+    frame = rng.integers(0, 256, size=(height, width, 3), dtype=np.uint8)
+    positions = list(zip(rng.integers(0, width, num_conditions), rng.integers(0, height, num_conditions)))
+    colors = [tuple(frame[y, x]) for x, y in positions]
+    evaluator = ColorConditionEvaluator(positions, colors)
+    start = time.perf_counter()
+    for _ in range(repeat):
+        evaluator.evaluate(frame)
+    elapsed = time.perf_counter() - start
+    return elapsed / repeat
+
+
+if __name__ == "__main__":
+    for n in (1, 20, 200, 2000):
+        print(f"{n} condições: {benchmark(n) * 1e6:.1f} us/frame")
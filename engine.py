@@ -0,0 +1,388 @@
+import argparse
+import json
+import os
+import signal
+import threading
+import time
+
+from actions import ActionExecutor, BurstResult, run_click_burst
+from capture import FrameCapture, LazyCaptureBackend
+from conditions import compile_condition_tree
+from eventlog import ErrorReporter, EventLog
+from geometry import WINDOW_COORDINATES, WindowGeometryTracker
+from input_backends import InputSession, LazyInput
+from metrics import StageMetrics
+from profile_compiler import load_profile as load_compiled_profile
+from scheduler import TaskScheduler
+
+# Motor de triggers/ações sem GUI: não importa PyQt5. A GUI (play.py) e a
+# linha de comando (python engine.py perfil.json --window "Título") usam o
+# mesmo Engine.
+
+SCRIPT_DIR = os.path.dirname(os.path.realpath(__file__))
+
+
+class Task:
+    def __init__(self, name, condition_type, condition_value, condition_position, action_type, action_position=None, frequency=None, duration=None, sequence=None, delay=None, engine=None, priority=0, tolerance_mode='exact', tolerance=0, template_path=None, search_region=None, poll_min=0.05, poll_max=0.5, trigger_mode='level', hold_frames=1, off_tolerance=None, cooldown=0.0):
+        self.name = name
+        self.condition_type = condition_type
+        self.condition_value = condition_value
+        self.condition_position = condition_position  # Position to check the color
+        self.action_type = action_type
+        self.action_position = action_position  # Position to click (can be None)
+        self.sequence = sequence
+        self.delay = delay
+        self.frequency = frequency
+        self.duration = duration
+        self.priority = priority  # Maior prioridade pode interromper ações mais longas
+        self.tolerance_mode = tolerance_mode  # 'exact', 'euclidean', 'channel' ou 'hue'
+        self.tolerance = tolerance
+        # Condição 'template': condition_value guarda o score mínimo (NCC) para disparar
+        self.template_path = template_path
+        self.search_region = search_region  # (x, y, width, height) ou None para a área toda
+        # Faixa do polling adaptativo das condições de cor/template, em segundos
+        self.poll_min = poll_min
+        self.poll_max = poll_max
+        # Semântica do disparo: 'level', 'rising' ou 'hold' (hold_frames avaliações seguidas)
+        self.trigger_mode = trigger_mode
+        self.hold_frames = hold_frames
+        self.off_tolerance = off_tolerance  # Histerese: limiar para desligar (None = igual a tolerance)
+        self.cooldown = cooldown  # Intervalo mínimo entre disparos, em segundos
+        self.last_burst_rate = None  # Cliques/s realmente entregues no último burst
+        self.burst_totals = (0, 0.0)  # Cliques e segundos do burst atual, somando as retomadas
+        self.fire_count = 0  # Disparos aceitos pelo executor
+        self.last_fired = None  # Horário (time.time) do último disparo
+        self.triggered_at = None  # Quando o scheduler viu a condição (monotonic)
+        self.running = False
+        self.engine = engine
+
+    def validate(self):
+        # Motivo pelo qual a task não pode rodar, ou None
+        if self.condition_type == 'color' and self.condition_position is None:
+            return "Posição de verificação da cor não definida."
+        if self.condition_type == 'template' and not self.template_path:
+            return "Template da condição não definido."
+        if self.condition_type == 'compound':
+            leaves = []
+            try:
+                compile_condition_tree(self.condition_value, leaves)
+            except (ValueError, TypeError) as e:
+                return f"Condição composta inválida: {e}"
+            # Folhas fora da área observada nunca são amostradas
+            area = self.engine.get_window_area() if self.engine else None
+            if area:
+                x, y, width, height = area
+                for (px, py), _, _ in leaves:
+                    if not (x <= px < x + width and y <= py < y + height):
+                        return f"Pixel ({px}, {py}) da condição composta fora da área observada."
+        return None
+
+    def start(self):
+        self.engine.start_tasks([self])
+
+    def stop(self):
+        if not self.engine.stop_tasks([self]):
+            self.log('task_already_stopped')
+
+    def perform_action(self, should_yield=None, resume=None):
+        # Retorna None quando a ação termina, ou o ponto de retomada quando uma
+        # ação mais prioritária pede a vez (should_yield)
+        remaining = None
+        if self.engine and self.engine.selected_window:
+            metrics = self.engine.metrics
+            action_start = time.perf_counter()
+            # Foco e cursor ficam a cargo da sessão; o cursor volta quando a fila esvazia
+            self.engine.input_session.begin(self.engine.selected_window)
+            metrics.record('activate_ms', (time.perf_counter() - action_start) * 1000, self.name)
+            mouse = self.engine.input_backend
+            clicks = 0
+            # Posições relativas à janela; a origem vem do cache do tracker
+            to_screen = self.engine.geometry.to_screen
+            if self.action_type == 'click':
+                mouse.click(*to_screen(self.action_position))
+                self.record_first_click()
+                clicks = 1
+            elif self.action_type == 'clicks':
+                duration = self.duration if resume is None else resume
+                # Move uma vez e depois só down/up a cada clique
+                mouse.move(*to_screen(self.action_position))
+                def click():
+                    mouse.press()
+                    mouse.release()
+                    if self.triggered_at is not None:
+                        self.record_first_click()
+                result = run_click_burst(
+                    click, self.frequency, duration,
+                    lambda: not self.running or (should_yield is not None and should_yield())
+                )
+                clicks = result.clicks
+                total_clicks, total_elapsed = self.burst_totals if resume is not None else (0, 0.0)
+                total_clicks += result.clicks
+                total_elapsed += result.elapsed
+                if not result.completed and self.running:
+                    # Retoma no próximo deadline do cronograma, não no instante do último clique
+                    remaining = duration - result.scheduled
+                    self.burst_totals = (total_clicks, total_elapsed)
+                else:
+                    self.last_burst_rate = BurstResult(total_clicks, total_elapsed, True).rate
+            elif self.action_type == 'sequence':
+                start = 0 if resume is None else resume
+                for index in range(start, len(self.sequence)):
+                    if not self.running:
+                        break
+                    if should_yield and should_yield():
+                        remaining = index
+                        break
+                    mouse.click(*to_screen(self.sequence[index]))
+                    self.record_first_click()
+                    clicks += 1
+                    time.sleep(self.delay)
+            metrics.count('clicks', clicks, self.name)
+            metrics.record('action_ms', (time.perf_counter() - action_start) * 1000, self.name)
+        else:
+            self.log('action_skipped', reason="Window not selected or invalid.")
+        return remaining
+
+    def log(self, event, **fields):
+        # Eventos vão para o log estruturado em vez de stdout
+        if self.engine.event_log:
+            self.engine.event_log.emit(event, task=self.name, **fields)
+
+    def record_first_click(self):
+        # Latência da condição vista até o primeiro clique entregue
+        if self.triggered_at is not None:
+            latency = (time.monotonic() - self.triggered_at) * 1000
+            self.triggered_at = None
+            self.engine.metrics.record('trigger_to_click_ms', latency, self.name)
+
+    def __str__(self):
+        return f"Task(name={self.name}, condition_type={self.condition_type}, action_type={self.action_type})"
+
+
+def task_to_dict(task, base_dir=SCRIPT_DIR):
+    # Converte a cor de condição para uma tupla, se necessário
+    condition_value = task.condition_value
+    if isinstance(condition_value, list):
+        condition_value = tuple(condition_value)  # Converte lista para tupla
+    return {
+        'name': task.name,
+        'condition_type': task.condition_type,
+        'condition_value': condition_value,
+        'condition_position': task.condition_position,
+        'action_type': task.action_type,
+        'action_position': task.action_position,
+        'frequency': task.frequency,
+        'duration': task.duration,
+        'sequence': task.sequence,
+        'delay': task.delay,
+        'priority': task.priority,
+        'tolerance_mode': task.tolerance_mode,
+        'tolerance': task.tolerance,
+        # Caminho do template relativo à pasta do programa
+        'template_path': os.path.relpath(task.template_path, base_dir) if task.template_path else None,
+        'search_region': task.search_region,
+        'poll_min': task.poll_min,
+        'poll_max': task.poll_max,
+        'trigger_mode': task.trigger_mode,
+        'hold_frames': task.hold_frames,
+        'off_tolerance': task.off_tolerance,
+        'cooldown': task.cooldown
+    }
+
+
+def task_from_dict(task_data, engine, base_dir=SCRIPT_DIR):
+    # task_data vem do profile_compiler, já validado e com todos os campos e
+    # defaults; só o caminho do template é resolvido a partir de base_dir
+    template_path = task_data['template_path']
+    return Task(
+        engine=engine,
+        **dict(task_data, template_path=os.path.join(base_dir, template_path) if template_path else None)
+    )
+
+
+def find_window(title):
+    # pygetwindow só é importado quando uma janela é procurada
+    import pygetwindow as gw
+    windows = gw.getWindowsWithTitle(title)
+    return windows[0] if windows else None
+
+
+class Engine:
+    # Estado compartilhado por todas as tasks: janela alvo, captura, entrada,
+    # scheduler e executor. Não depende de Qt. capture_backend e input_backend
+    # aceitam o nome do backend ou uma instância pronta (ex.: para testes); pelo
+    # nome, o dispositivo só é aberto no primeiro uso.
+    def __init__(self, capture_backend='auto', input_backend='auto', log_path=None, base_dir=SCRIPT_DIR):
+        self.base_dir = base_dir
+        self.selected_window = None
+        self.selected_area = None  # (x, y, width, height) relativo à janela
+        self.tasks = []
+        # Log estruturado gravado em lotes por uma thread de fundo; os erros
+        # repetidos dos loops vão para ele uma vez por estado, sem print por tick
+        self.event_log = EventLog(log_path) if log_path else None
+        self.errors = ErrorReporter(self.event_log)
+        # Geometria da janela alvo em cache; as tasks guardam posições relativas a ela
+        self.geometry = WindowGeometryTracker(on_resize=self.on_window_resized, errors=self.errors)
+        # Timers por estágio (captura, avaliação, ativação, latência, cliques)
+        self.metrics = StageMetrics()
+        if isinstance(capture_backend, str):
+            capture_backend = LazyCaptureBackend(capture_backend)
+        self.capture_backend = capture_backend
+        self.frame_capture = FrameCapture(
+            self.get_window_area, self.capture_backend, origin_provider=self.geometry.origin, metrics=self.metrics,
+            errors=self.errors
+        )
+        # Backend de entrada usado pelas ações (XTest direto quando disponível)
+        if isinstance(input_backend, str):
+            input_backend = LazyInput(input_backend)
+        self.input_backend = input_backend
+        self.input_session = InputSession(self.input_backend)
+        self.action_executor = ActionExecutor(on_idle=self.input_session.end, event_log=self.event_log)
+        self.scheduler = TaskScheduler(self.frame_capture, self.action_executor, event_log=self.event_log, errors=self.errors)
+
+    def set_window(self, window):
+        self.selected_window = window
+        self.geometry.set_window(window)
+
+    def get_window_area(self):
+        # Área observada relativa à janela: a selecionada ou a janela inteira
+        if not self.selected_window:
+            return None
+        if self.selected_area:
+            return self.selected_area  # (x, y, width, height)
+        size = self.geometry.size()
+        return (0, 0) + size if size else None
+
+    def get_capture_region(self):
+        # Mesma área em coordenadas de tela, pela geometria em cache
+        return self.geometry.to_screen_region(self.get_window_area())
+
+    def on_window_resized(self):
+        # Chamado pela thread do tracker: o plano de captura depende do tamanho da janela
+        self.frame_capture.invalidate()
+
+    def read_profile(self, file_path):
+        # Perfil validado e normalizado pelo compilador (do cache quando o JSON
+        # não mudou). Perfil antigo com posições absolutas: converte pela posição
+        # atual da janela, então exige uma janela selecionada.
+        origin = self.geometry.origin() if self.selected_window else None
+        return load_compiled_profile(file_path, origin)
+
+    def load_profile(self, file_path, replace=False):
+        # Acrescenta as tasks do perfil (ou, com replace, troca as atuais por elas)
+        # e retorna a lista das novas tasks. O perfil é lido e validado antes:
+        # se falhar, as tasks atuais ficam intactas.
+        data = self.read_profile(file_path)
+        if replace:
+            self.stop_tasks(self.tasks)
+            self.tasks = []
+        self.selected_area = tuple(data['selected_area']) if data['selected_area'] else None
+        self.frame_capture.invalidate()
+        tasks = [task_from_dict(task_data, self, self.base_dir) for task_data in data['tasks']]
+        self.tasks.extend(tasks)
+        # Pré-processa os templates do perfil uma vez, fora do loop de avaliação
+        profile = os.path.abspath(file_path)
+        self.frame_capture.set_profile(profile)
+        self.frame_capture.template_cache.preload(profile, [task.template_path for task in tasks if task.template_path])
+        return tasks
+
+    def save_profile(self, file_path):
+        data = {
+            'coordinates': WINDOW_COORDINATES,
+            'tasks': [task_to_dict(task, self.base_dir) for task in self.tasks],
+            'selected_area': self.selected_area
+        }
+        with open(file_path, 'w') as file:
+            json.dump(data, file, indent=4)
+
+    def start_tasks(self, tasks):
+        # Liga as tasks num único lote no scheduler; retorna as que foram ligadas
+        started = []
+        for task in tasks:
+            if task.running:
+                task.log('task_already_running')
+                continue
+            reason = task.validate()
+            if reason:
+                task.log('task_invalid', reason=reason)
+                continue
+            task.running = True
+            started.append(task)
+        # O scheduler central cuida do trigger; nenhuma thread por task
+        self.scheduler.add_many(started)
+        for task in started:
+            task.log('task_started', condition=task.condition_type, action=task.action_type)
+        return started
+
+    def stop_tasks(self, tasks):
+        # Não bloqueia: uma ação em andamento para no próximo clique
+        stopped = [task for task in tasks if task.running]
+        for task in stopped:
+            task.running = False
+        self.scheduler.remove_many(stopped)
+        for task in stopped:
+            task.log('task_stopped')
+        return stopped
+
+    def update_task(self, task):
+        # Task editada: se estiver rodando, volta ao scheduler com o trigger,
+        # a histerese e o polling novos
+        self.frame_capture.invalidate()
+        if not task.running:
+            return
+        reason = task.validate()
+        if reason:
+            self.stop_tasks([task])
+            task.log('task_invalid', reason=reason)
+            return
+        self.scheduler.add_many([task])
+        task.log('task_updated', condition=task.condition_type, action=task.action_type)
+
+    def start_all(self):
+        return self.start_tasks(self.tasks)
+
+    def stop_all(self):
+        return self.stop_tasks(self.tasks)
+
+    def close(self):
+        self.stop_all()
+        self.scheduler.shutdown()
+        self.geometry.stop()
+        self.capture_backend.close()
+        self.input_backend.close()
+        if self.event_log:
+            self.event_log.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Executa um perfil sem a interface gráfica")
+    parser.add_argument('profile', help="Caminho do perfil JSON (ex.: profiles/Tap.json)")
+    parser.add_argument('--window', required=True, help="Título da janela alvo")
+    parser.add_argument('--capture', default=os.environ.get('AUTOPLAY_CAPTURE', 'auto'))
+    parser.add_argument('--input', default=os.environ.get('AUTOPLAY_INPUT', 'auto'))
+    parser.add_argument('--log', default=os.path.join(SCRIPT_DIR, 'logs', 'events.jsonl'))
+    parser.add_argument('--duration', type=float, help="Para depois deste tempo (s); sem ele roda até Ctrl+C")
+    args = parser.parse_args()
+
+    engine = Engine(args.capture, args.input, args.log)
+    window = find_window(args.window)
+    if window is None:
+        parser.error(f"Janela não encontrada: {args.window}")
+    engine.set_window(window)
+    try:
+        tasks = engine.load_profile(args.profile)
+    except (OSError, ValueError) as e:
+        engine.close()
+        parser.error(str(e))
+    print(f"{len(tasks)} tasks carregadas de {args.profile}; rodando em '{args.window}'.")
+
+    done = threading.Event()
+    signal.signal(signal.SIGINT, lambda *_: done.set())
+    signal.signal(signal.SIGTERM, lambda *_: done.set())
+    engine.start_all()
+    done.wait(args.duration)
+    engine.close()
+
+
+if __name__ == "__main__":
+    main()
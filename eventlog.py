@@ -0,0 +1,125 @@
+import json
+import os
+import queue
+import threading
+import time
+
+
+class EventLog:
+    # Log estruturado (uma linha JSON por evento). As threads quentes só fazem
+    # put_nowait numa fila limitada; se ela encher, o evento é descartado e
+    # contado em vez de bloquear. Uma thread de fundo grava em lotes num
+    # arquivo com rotação por tamanho.
+    def __init__(self, path, max_bytes=5 * 1024 * 1024, backup_count=3, queue_size=10000, flush_interval=0.5, batch_size=500):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.dropped = 0
+        self.file = None
+        self.closed = False
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def emit(self, event, **fields):
+        if self.closed:
+            return
+        try:
+            self.queue.put_nowait((time.time(), event, fields))
+        except queue.Full:
+            self.dropped += 1
+
+    def run(self):
+        while True:
+            try:
+                batch = [self.queue.get(timeout=self.flush_interval)]
+            except queue.Empty:
+                if self.closed:
+                    break
+                continue
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            if None in batch:
+                self.write([record for record in batch if record is not None])
+                break
+            self.write(batch)
+        if self.file:
+            self.file.close()
+            self.file = None
+
+    def write(self, batch):
+        if not batch:
+            return
+        lines = []
+        for timestamp, event, fields in batch:
+            record = {'ts': round(timestamp, 6), 'event': event}
+            record.update(fields)
+            lines.append(json.dumps(record, default=str))
+        try:
+            if self.file is None:
+                directory = os.path.dirname(self.path)
+                if directory and not os.path.exists(directory):
+                    os.makedirs(directory)
+                self.file = open(self.path, 'a')
+            self.file.write("\n".join(lines) + "\n")
+            self.file.flush()
+            if self.file.tell() >= self.max_bytes:
+                self.rotate()
+        except OSError as e:
+            print(f"Erro ao gravar o log de eventos: {e}")
+
+    def rotate(self):
+        # events.jsonl -> events.jsonl.1 -> ... -> events.jsonl.<backup_count>
+        self.file.close()
+        self.file = None
+        for index in range(self.backup_count - 1, 0, -1):
+            source = f"{self.path}.{index}"
+            if os.path.exists(source):
+                os.replace(source, f"{self.path}.{index + 1}")
+        if self.backup_count > 0:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        try:
+            self.queue.put(None, timeout=1.0)
+        except queue.Full:
+            pass
+        self.thread.join(timeout=2.0)
+
+
+class ErrorReporter:
+    # Erros repetidos dos loops quentes (captura, scheduler, geometria): em vez
+    # de um print por tick, emite um evento quando o erro aparece ou muda e
+    # outro quando ele some, com o número de repetições. Sem EventLog, imprime
+    # uma vez por estado de erro.
+    def __init__(self, event_log=None):
+        self.event_log = event_log
+        self.active = {}  # origem -> mensagem atual
+        self.repeats = {}  # origem -> ocorrências desde que o erro apareceu
+
+    def error(self, source, message):
+        self.repeats[source] = self.repeats.get(source, 0) + 1
+        if self.active.get(source) == message:
+            return
+        self.active[source] = message
+        if self.event_log:
+            self.event_log.emit('error', source=source, message=message)
+        else:
+            print(message)
+
+    def clear(self, source):
+        if self.active.pop(source, None) is None:
+            return
+        repeats = self.repeats.pop(source, 0)
+        if self.event_log:
+            self.event_log.emit('error_cleared', source=source, repeats=repeats)
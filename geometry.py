@@ -0,0 +1,125 @@
+import threading
+
+from eventlog import ErrorReporter
+
+# Versão do formato de coordenadas gravado nos perfis. Perfis sem a chave
+# 'coordinates' são do formato antigo, com posições absolutas de tela.
+WINDOW_COORDINATES = 'window'
+
+
+class LegacyProfileError(ValueError):
+    # Perfil antigo carregado sem janela selecionada: sem a origem da janela não
+    # dá para converter as posições absolutas
+    def __init__(self, path):
+        self.path = path
+        super().__init__("Perfil antigo: selecione a janela antes de carregá-lo.")
+
+
+class WindowGeometryTracker:
+    # Mantém em cache o retângulo da janela alvo. Uma thread lê a geometria em
+    # baixa frequência (e refresh() força uma leitura), então os caminhos de
+    # captura e clique só fazem somas, sem consultar o gerenciador de janelas.
+    def __init__(self, interval=0.5, on_resize=None, errors=None):
+        self.interval = interval
+        self.errors = errors or ErrorReporter()
+        self.on_resize = on_resize  # Chamado quando largura/altura mudam
+        self.window = None
+        self.rect = None  # (left, top, width, height) em coordenadas de tela
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def set_window(self, window):
+        self.window = window
+        self.refresh()
+        if self.thread is None:
+            self.stop_event.clear()
+            self.thread = threading.Thread(target=self.run, daemon=True)
+            self.thread.start()
+
+    def refresh(self):
+        window = self.window
+        if window is None:
+            return self.rect
+        try:
+            rect = (window.left, window.top, window.width, window.height)
+        except Exception as e:
+            # Janela fechada ou minimizada: mantém o último retângulo conhecido
+            self.errors.error('geometry', f"Erro ao ler a geometria da janela: {e}")
+            return self.rect
+        self.errors.clear('geometry')
+        with self.lock:
+            previous, self.rect = self.rect, rect
+        if previous is not None and previous[2:] != rect[2:] and self.on_resize:
+            self.on_resize()
+        return rect
+
+    def run(self):
+        while not self.stop_event.wait(self.interval):
+            self.refresh()
+
+    def stop(self):
+        self.stop_event.set()
+        self.thread = None
+
+    def origin(self):
+        rect = self.rect
+        return (rect[0], rect[1]) if rect else (0, 0)
+
+    def size(self):
+        rect = self.rect
+        return (rect[2], rect[3]) if rect else None
+
+    def to_screen(self, point):
+        left, top = self.origin()
+        return (point[0] + left, point[1] + top)
+
+    def to_screen_region(self, region):
+        if region is None:
+            return None
+        left, top = self.origin()
+        return (region[0] + left, region[1] + top, region[2], region[3])
+
+
+def shift_condition_tree(tree, dx, dy):
+    # Desloca as posições 'pixel' de uma condição composta (formato JSON)
+    if isinstance(tree, dict):
+        shifted = {}
+        for key, value in tree.items():
+            if key == 'pixel':
+                shifted[key] = [value[0] + dx, value[1] + dy]
+            else:
+                shifted[key] = shift_condition_tree(value, dx, dy)
+        return shifted
+    if isinstance(tree, list):
+        return [shift_condition_tree(item, dx, dy) for item in tree]
+    return tree
+
+
+def convert_legacy_profile(data, origin):
+    # Converte um perfil com posições absolutas para posições relativas à
+    # janela, assumindo que a janela está onde estava quando ele foi salvo
+    dx, dy = -origin[0], -origin[1]
+
+    def shift(point):
+        return [point[0] + dx, point[1] + dy] if point else point
+
+    def shift_region(region):
+        return [region[0] + dx, region[1] + dy, region[2], region[3]] if region else region
+
+    tasks = []
+    for task_data in data.get('tasks', []):
+        task_data = dict(task_data)
+        task_data['condition_position'] = shift(task_data.get('condition_position'))
+        task_data['action_position'] = shift(task_data.get('action_position'))
+        if task_data.get('sequence'):
+            task_data['sequence'] = [shift(point) for point in task_data['sequence']]
+        task_data['search_region'] = shift_region(task_data.get('search_region'))
+        if task_data.get('condition_type') == 'compound':
+            task_data['condition_value'] = shift_condition_tree(task_data['condition_value'], dx, dy)
+        tasks.append(task_data)
+    converted = dict(data)
+    converted['tasks'] = tasks
+    converted['selected_area'] = shift_region(data.get('selected_area'))
+    converted['coordinates'] = WINDOW_COORDINATES
+    return converted
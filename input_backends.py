@@ -0,0 +1,259 @@
+import ctypes
+import ctypes.util
+import os
+import sys
+import threading
+import time
+
+BUTTONS = {'left': 1, 'middle': 2, 'right': 3}
+
+
+class InputBackend:
+    # Interface de entrada: mouse em coordenadas de tela, sem pausas implícitas
+    name = None
+
+    def position(self):
+        raise NotImplementedError
+
+    def move(self, x, y):
+        raise NotImplementedError
+
+    def press(self, button='left'):
+        raise NotImplementedError
+
+    def release(self, button='left'):
+        raise NotImplementedError
+
+    def click(self, x, y, button='left'):
+        self.move(x, y)
+        self.press(button)
+        self.release(button)
+
+    def close(self):
+        pass
+
+
+class PyAutoGuiInput(InputBackend):
+    # Caminho original via pyautogui, mas sem o PAUSE entre eventos
+    name = 'pyautogui'
+
+    def __init__(self):
+        import pyautogui
+        self.pyautogui = pyautogui
+
+    def position(self):
+        return tuple(self.pyautogui.position())
+
+    def move(self, x, y):
+        self.pyautogui.moveTo(x, y, _pause=False)
+
+    def press(self, button='left'):
+        self.pyautogui.mouseDown(button=button, _pause=False)
+
+    def release(self, button='left'):
+        self.pyautogui.mouseUp(button=button, _pause=False)
+
+
+class XTestInput(InputBackend):
+    # Eventos sintéticos direto pela extensão XTest: cada evento é uma chamada
+    # de biblioteca + XFlush, sem PAUSE, failsafe ou subprocessos.
+    name = 'xtest'
+
+    def __init__(self, display=None):
+        if not sys.platform.startswith('linux'):
+            raise OSError("XTest só está disponível no X11/Linux")
+        libx11 = ctypes.util.find_library('X11')
+        libxtst = ctypes.util.find_library('Xtst')
+        if not libx11 or not libxtst:
+            raise OSError("libX11/libXtst não encontradas")
+        self.xlib = ctypes.CDLL(libx11)
+        self.xtst = ctypes.CDLL(libxtst)
+        self.setup_prototypes()
+        display_name = (display or os.environ.get('DISPLAY', '')).encode() or None
+        self.display = self.xlib.XOpenDisplay(display_name)
+        if not self.display:
+            raise OSError("Não foi possível abrir o display X11")
+        self.root = self.xlib.XDefaultRootWindow(self.display)
+        self.lock = threading.Lock()
+
+    def setup_prototypes(self):
+        xlib, xtst = self.xlib, self.xtst
+        xlib.XOpenDisplay.restype = ctypes.c_void_p
+        xlib.XOpenDisplay.argtypes = [ctypes.c_char_p]
+        xlib.XCloseDisplay.argtypes = [ctypes.c_void_p]
+        xlib.XDefaultRootWindow.restype = ctypes.c_ulong
+        xlib.XDefaultRootWindow.argtypes = [ctypes.c_void_p]
+        xlib.XFlush.argtypes = [ctypes.c_void_p]
+        xlib.XQueryPointer.argtypes = [
+            ctypes.c_void_p, ctypes.c_ulong,
+            ctypes.POINTER(ctypes.c_ulong), ctypes.POINTER(ctypes.c_ulong),
+            ctypes.POINTER(ctypes.c_int), ctypes.POINTER(ctypes.c_int),
+            ctypes.POINTER(ctypes.c_int), ctypes.POINTER(ctypes.c_int),
+            ctypes.POINTER(ctypes.c_uint)
+        ]
+        xtst.XTestFakeMotionEvent.argtypes = [ctypes.c_void_p, ctypes.c_int, ctypes.c_int, ctypes.c_int, ctypes.c_ulong]
+        xtst.XTestFakeButtonEvent.argtypes = [ctypes.c_void_p, ctypes.c_uint, ctypes.c_int, ctypes.c_ulong]
+
+    def position(self):
+        root, child = ctypes.c_ulong(), ctypes.c_ulong()
+        root_x, root_y, win_x, win_y = ctypes.c_int(), ctypes.c_int(), ctypes.c_int(), ctypes.c_int()
+        mask = ctypes.c_uint()
+        with self.lock:
+            self.xlib.XQueryPointer(
+                self.display, self.root, ctypes.byref(root), ctypes.byref(child),
+                ctypes.byref(root_x), ctypes.byref(root_y), ctypes.byref(win_x), ctypes.byref(win_y),
+                ctypes.byref(mask)
+            )
+        return root_x.value, root_y.value
+
+    def move(self, x, y):
+        with self.lock:
+            self.xtst.XTestFakeMotionEvent(self.display, -1, int(x), int(y), 0)
+            self.xlib.XFlush(self.display)
+
+    def press(self, button='left'):
+        with self.lock:
+            self.xtst.XTestFakeButtonEvent(self.display, BUTTONS[button], 1, 0)
+            self.xlib.XFlush(self.display)
+
+    def release(self, button='left'):
+        with self.lock:
+            self.xtst.XTestFakeButtonEvent(self.display, BUTTONS[button], 0, 0)
+            self.xlib.XFlush(self.display)
+
+    def click(self, x, y, button='left'):
+        # Os três eventos saem num único flush
+        with self.lock:
+            self.xtst.XTestFakeMotionEvent(self.display, -1, int(x), int(y), 0)
+            self.xtst.XTestFakeButtonEvent(self.display, BUTTONS[button], 1, 0)
+            self.xtst.XTestFakeButtonEvent(self.display, BUTTONS[button], 0, 0)
+            self.xlib.XFlush(self.display)
+
+    def close(self):
+        with self.lock:
+            if self.display:
+                self.xlib.XCloseDisplay(self.display)
+                self.display = None
+
+
+class RecordingInput(InputBackend):
+    # Não toca no sistema: registra (timestamp, evento, dados) para testes e benchmarks
+    name = 'recording'
+
+    def __init__(self, clock=time.monotonic, start_position=(0, 0)):
+        self.clock = clock
+        self.cursor = tuple(start_position)
+        self.events = []
+        self.lock = threading.Lock()
+
+    def record(self, event, *args):
+        with self.lock:
+            self.events.append((self.clock(), event) + args)
+
+    def position(self):
+        return self.cursor
+
+    def move(self, x, y):
+        self.cursor = (x, y)
+        self.record('move', x, y)
+
+    def press(self, button='left'):
+        self.record('press', button, self.cursor)
+
+    def release(self, button='left'):
+        self.record('release', button, self.cursor)
+
+    def clicks(self):
+        # Timestamps de cada clique completo (release)
+        with self.lock:
+            return [event[0] for event in self.events if event[1] == 'release']
+
+    def clear(self):
+        with self.lock:
+            self.events = []
+
+
+class InputSession:
+    # Estado de foco e cursor compartilhado por ações seguidas: a janela só é
+    # ativada quando perdeu o foco, e o cursor do usuário é salvo na primeira
+    # ação e restaurado uma vez só, quando a fila de ações esvazia (end).
+    def __init__(self, backend):
+        self.backend = backend
+        self.saved_position = None
+        self.activations = 0
+        self.lock = threading.Lock()
+
+    def begin(self, window):
+        with self.lock:
+            if self.saved_position is None:
+                self.saved_position = self.backend.position()
+        self.ensure_focus(window)
+
+    def ensure_focus(self, window):
+        try:
+            active = window.isActive
+        except Exception:
+            active = False
+        if not active:
+            window.activate()
+            self.activations += 1
+
+    def end(self):
+        with self.lock:
+            position, self.saved_position = self.saved_position, None
+        if position is not None:
+            self.backend.move(*position)
+
+
+class LazyInput(InputBackend):
+    # Adia a abertura do dispositivo de entrada até a primeira ação
+    def __init__(self, backend_name='auto', **kwargs):
+        self.backend_name = backend_name
+        self.kwargs = kwargs
+        self.backend = None
+        self.lock = threading.Lock()
+
+    def get(self):
+        with self.lock:
+            if self.backend is None:
+                self.backend = create_input_backend(self.backend_name, **self.kwargs)
+            return self.backend
+
+    def position(self):
+        return self.get().position()
+
+    def move(self, x, y):
+        self.get().move(x, y)
+
+    def press(self, button='left'):
+        self.get().press(button)
+
+    def release(self, button='left'):
+        self.get().release(button)
+
+    def click(self, x, y, button='left'):
+        self.get().click(x, y, button)
+
+    def close(self):
+        with self.lock:
+            backend, self.backend = self.backend, None
+        if backend is not None:
+            backend.close()
+
+
+INPUT_BACKENDS = {
+    'pyautogui': PyAutoGuiInput,
+    'xtest': XTestInput,
+    'recording': RecordingInput,
+}
+
+
+def create_input_backend(name='auto', **kwargs):
+    # 'auto' tenta o XTest e cai para o pyautogui se não estiver disponível
+    if name == 'auto':
+        try:
+            return XTestInput(**kwargs)
+        except OSError as e:
+            print(f"Entrada XTest indisponível ({e}); usando pyautogui.")
+            return PyAutoGuiInput()
+    return INPUT_BACKENDS[name](**kwargs)
@@ -0,0 +1,118 @@
+import csv
+import json
+import threading
+import time
+from collections import deque
+
+# Estágios medidos nos caminhos de condição e de ação (valores em ms)
+STAGES = ('capture_ms', 'evaluate_ms', 'activate_ms', 'trigger_to_click_ms', 'action_ms')
+
+
+class StageMetrics:
+    # Timers por estágio em ring buffers (deque com maxlen): registrar um valor
+    # é só um append, sem lock, então pode ser chamado das threads quentes.
+    # Cada amostra vai para o buffer global do estágio e, se houver, para o da task.
+    def __init__(self, size=512):
+        self.size = size
+        self.buffers = {}  # (task ou None, estágio) -> deque de valores
+        self.counters = {}  # (task ou None, contador) -> total
+        self.lock = threading.Lock()  # Só para criar buffers novos
+
+    def buffer(self, key):
+        buffer = self.buffers.get(key)
+        if buffer is None:
+            with self.lock:
+                buffer = self.buffers.setdefault(key, deque(maxlen=self.size))
+        return buffer
+
+    def record(self, stage, value, task=None):
+        self.buffer((None, stage)).append(value)
+        if task is not None:
+            self.buffer((task, stage)).append(value)
+
+    def count(self, name, amount=1, task=None):
+        # Contadores monotônicos (ex.: cliques entregues)
+        for key in ((None, name), (task, name)) if task is not None else ((None, name),):
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def clear(self):
+        with self.lock:
+            self.buffers = {}
+            self.counters = {}
+
+    @staticmethod
+    def summarize(values):
+        if not values:
+            return None
+        ordered = sorted(values)
+        last = len(ordered) - 1
+        return {
+            'count': len(ordered),
+            'mean': sum(ordered) / len(ordered),
+            'p50': ordered[last // 2],
+            'p95': ordered[int(round(last * 0.95))],
+            'max': ordered[last],
+        }
+
+    def summary(self):
+        # {task ou '*': {estágio: resumo, contador: total}}
+        result = {}
+        for (task, stage), buffer in list(self.buffers.items()):
+            stats = self.summarize(list(buffer))
+            if stats:
+                result.setdefault(task or '*', {})[stage] = stats
+        for (task, name), total in list(self.counters.items()):
+            result.setdefault(task or '*', {})[name] = total
+        return result
+
+    def samples(self):
+        # Amostras brutas ainda no buffer: [(task ou '*', estágio, índice, valor)]
+        rows = []
+        for (task, stage), buffer in list(self.buffers.items()):
+            for index, value in enumerate(list(buffer)):
+                rows.append((task or '*', stage, index, value))
+        return rows
+
+    def export_json(self, path):
+        with open(path, 'w') as file:
+            json.dump({'summary': self.summary(), 'samples': self.samples()}, file, indent=4)
+
+    def export_csv(self, path):
+        with open(path, 'w', newline='') as file:
+            writer = csv.writer(file)
+            writer.writerow(['task', 'stage', 'index', 'value'])
+            writer.writerows(self.samples())
+            for (task, name), total in list(self.counters.items()):
+                writer.writerow([task or '*', name, '', total])
+
+    def format_summary(self):
+        # Texto curto para o painel da GUI: só os totais gerais
+        overall = self.summary().get('*', {})
+        lines = []
+        for stage in STAGES:
+            stats = overall.get(stage)
+            if stats:
+                lines.append(f"{stage}: p50 {stats['p50']:.1f}  p95 {stats['p95']:.1f}  máx {stats['max']:.1f}")
+        if 'clicks' in overall:
+            lines.append(f"cliques entregues: {overall['clicks']}")
+        return "\n".join(lines) or "Sem medições ainda."
+
+
+class StartupTimer:
+    # Relatório de inicialização: tempo de cada fase desde a anterior
+    def __init__(self, start=None):
+        self.start = start if start is not None else time.perf_counter()
+        self.last = self.start
+        self.phases = []  # [(fase, ms)]
+
+    def mark(self, phase):
+        now = time.perf_counter()
+        self.phases.append((phase, (now - self.last) * 1000))
+        self.last = now
+
+    def total_ms(self):
+        return (self.last - self.start) * 1000
+
+    def report(self, title="Inicialização"):
+        parts = [f"{phase} {ms:.0f} ms" for phase, ms in self.phases]
+        return f"{title}: {', '.join(parts)} (total {self.total_ms():.0f} ms)"
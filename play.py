@@ -1,20 +1,37 @@
+import time
+startup_start = time.perf_counter()
 import sys
 import threading
-import time
 import os
 import json
 import random
 from PyQt5.QtWidgets import (
     QApplication, QMainWindow, QPushButton, QLabel, QListWidget,
     QListWidgetItem, QDialog, QVBoxLayout, QHBoxLayout, QWidget, QRadioButton,
-    QButtonGroup, QLineEdit, QMessageBox, QSpinBox, QDoubleSpinBox, QGroupBox, QCheckBox, QFileDialog
+    QButtonGroup, QLineEdit, QMessageBox, QSpinBox, QDoubleSpinBox, QGroupBox, QFileDialog,
+    QComboBox, QPlainTextEdit, QListView, QStyledItemDelegate, QStyle
 )
-from PyQt5.QtGui import QPixmap, QPainter, QPen, QColor, QIcon, QMouseEvent
-from PyQt5.QtCore import Qt, QRect, QTimer, QPoint, pyqtSignal, QObject
+from PyQt5.QtGui import QPixmap, QPainter, QPen, QColor, QIcon, QMouseEvent, QImage, QPalette
+from PyQt5.QtCore import Qt, QRect, QTimer, QPoint, pyqtSignal, QObject, QAbstractListModel, QModelIndex, QSize
+
+from eventlog import ErrorReporter
+from metrics import StartupTimer
+
+# NumPy, o motor (engine.py), pygetwindow e playsound só são importados quando
+# usados pela primeira vez; o motor é montado em segundo plano após a janela aparecer.
+STARTUP_TIMER = StartupTimer(startup_start)
+STARTUP_TIMER.mark("imports")
 
-import pygetwindow as gw
-import pyautogui
-from playsound import playsound
+def array_to_qimage(frame):
+    # Converte o frame (array HxWx3 RGB) direto para QImage, sem salvar/ler PNG do disco.
+    # QImage pode ser criado fora da thread da GUI; o copy() desacopla do buffer.
+    import numpy as np
+    frame = np.ascontiguousarray(frame)
+    height, width = frame.shape[:2]
+    return QImage(frame.data, width, height, frame.strides[0], QImage.Format_RGB888).copy()
+
+def array_to_pixmap(frame):
+    return QPixmap.fromImage(array_to_qimage(frame))
 
 class SelectWindowDialog(QDialog):
     def __init__(self, parent=None):
@@ -36,6 +53,7 @@ class SelectWindowDialog(QDialog):
         self.setLayout(layout)
 
     def populate_window_list(self):
+        import pygetwindow as gw
         windows = gw.getAllTitles()
         for title in windows:
             if title.strip():
@@ -65,6 +83,10 @@ class ImageLabel(QLabel):
         self.selecting_sequence_positions = False
         self.sequence_positions = []
         self.color_position = None
+        self.selecting_template = False
+        self.selecting_search_region = False
+        self.template_rect = None
+        self.search_rect = None
 
     def mousePressEvent(self, event):
         if not self.main_window.window_selected:
@@ -108,9 +130,21 @@ class ImageLabel(QLabel):
             self.drawing = False
             self.end_point = event.pos()
             self.rect = QRect(self.start_point, self.end_point)
-            self.rectangles = [self.rect.normalized()]
+            if self.selecting_template:
+                # O retângulo desenhado vira o template, não a área selecionada
+                self.template_rect = self.rect.normalized()
+                self.selecting_template = False
+                self.rect = QRect()
+                self.main_window.task_editor.update_template_preview(self.template_rect)
+            elif self.selecting_search_region:
+                self.search_rect = self.rect.normalized()
+                self.selecting_search_region = False
+                self.rect = QRect()
+                self.main_window.task_editor.update_search_region_preview(self.search_rect)
+            else:
+                self.rectangles = [self.rect.normalized()]
+                self.main_window.finish_selection_button.setEnabled(True)
             self.update()
-            self.main_window.finish_selection_button.setEnabled(True)
 
     def paintEvent(self, event):
         super().paintEvent(event)
@@ -129,140 +163,130 @@ class ImageLabel(QLabel):
             for idx, pos in enumerate(self.sequence_positions):
                 painter.drawPoint(pos)
                 painter.drawText(pos + QPoint(5, -5), str(idx + 1))
+        if self.search_rect:
+            pen = QPen(Qt.magenta, 1, Qt.DashLine)
+            painter.setPen(pen)
+            painter.drawRect(self.search_rect)
+        if self.template_rect:
+            pen = QPen(Qt.yellow, 2, Qt.SolidLine)
+            painter.setPen(pen)
+            painter.drawRect(self.template_rect)
 
-class TaskItem(QWidget):
-    def __init__(self, task, main_window):
-        super().__init__()
-        self.task = task
-        self.main_window = main_window
-        self.list_item = None  # Referência ao QListWidgetItem
-        layout = QHBoxLayout()
-        self.checkbox = QCheckBox()
-        self.checkbox.stateChanged.connect(self.toggle_task)
-        self.label = QLabel(task.name)
-        self.edit_button = QPushButton("Editar")
-        self.edit_button.clicked.connect(self.edit_task)
-        self.delete_button = QPushButton("Excluir")
-        self.delete_button.clicked.connect(self.delete_task)
-        layout.addWidget(self.checkbox)
-        layout.addWidget(self.label)
-        layout.addWidget(self.edit_button)
-        layout.addWidget(self.delete_button)
-        self.setLayout(layout)
-        self.setLayout(layout)
-
-    def toggle_task(self, state):
-        if state == Qt.Checked:
-            print(f"Habilitando task: {self.label.text()}")
-            self.task.start()
-        else:
-            print(f"Desabilitando task: {self.label.text()}")
-            self.task.stop()
-
-    def edit_task(self):
-        self.main_window.task_editor.edit_task(self.task)
-        self.update_task_name()
-
-    def delete_task(self):
-        self.task.stop()
-        self.main_window.tasks.remove(self.task)
-        self.main_window.task_list_widget.takeItem(self.main_window.task_list_widget.row(self.list_item))
-        self.main_window.status_label.setText(f"Task '{self.task.name}' excluída.")
-
-    def update_task_name(self):
-        self.label.setText(self.task.name)
-
-class Task:
-    def __init__(self, name, condition_type, condition_value, condition_position, action_type, action_position=None, frequency=None, duration=None, sequence=None, delay=None, main_window=None):
-        self.name = name
-        self.condition_type = condition_type
-        self.condition_value = condition_value
-        self.condition_position = condition_position  # Position to check the color
-        self.action_type = action_type
-        self.action_position = action_position  # Position to click (can be None)
-        self.sequence = sequence
-        self.delay = delay
-        self.frequency = frequency
-        self.duration = duration
-        self.running = False
-        self.thread = None
-        self.main_window = main_window
+TASK_ROLE = Qt.UserRole
+TASK_STATUS_ROLE = Qt.UserRole + 1
 
-    def start(self):
-        if not self.running:
-            self.running = True
-            if self.condition_type == 'time':
-                self.thread = threading.Thread(target=self.run_time_condition)
-            elif self.condition_type == 'color':
-                self.thread = threading.Thread(target=self.run_color_condition)
-            self.thread.start()
-            print(f"Task started: {self}")
-        else:
-            print("Task is already running.")
 
-    def stop(self):
-        if self.running:
-            self.running = False
-            if self.thread is not None:
-                self.thread.join()
-            print(f"Task stopped: {self}")
-        else:
-            print("Task is already stopped.")
-
-    def run_time_condition(self):
-        while self.running:
-            time.sleep(self.condition_value)
-            self.perform_action()
-
-    def run_color_condition(self):
-        while self.running:
-            if self.condition_position is None:
-                print("Posição de verificação da cor não definida.")
-                break
-            # Ajuste para considerar a área selecionada
-            if self.main_window.selected_area:
-                region = self.main_window.selected_area  # (x, y, width, height)
-                screenshot = pyautogui.screenshot(region=region)
-                x, y = self.condition_position
-                adjusted_x = x - region[0]
-                adjusted_y = y - region[1]
-                pix = screenshot.getpixel((adjusted_x, adjusted_y))
-            else:
-                screenshot = pyautogui.screenshot()
-                pix = screenshot.getpixel(self.condition_position)
-            #print(f"cor atual {pix[:3]}. Cor condicao {self.condition_value}")
-            if pix[:3] == self.condition_value:
-                #print("Acionando ação por cor")
-                self.perform_action()
-            time.sleep(0.1)
-
-    def perform_action(self):
-        #print("entrei")
-        if self.main_window and self.main_window.selected_window:
-            #print("entreiiiiiiii")
-            self.main_window.selected_window.activate()
-            original_position = pyautogui.position()
-            if self.action_type == 'click':
-                #print(f"cliquei em {self.action_position}")
-                pyautogui.click(self.action_position)
-            elif self.action_type == 'clicks':
-                end_time = time.time() + self.duration
-                interval = 1 / self.frequency
-                while time.time() < end_time and self.running:
-                    pyautogui.click(self.action_position)
-                    time.sleep(interval)
-            elif self.action_type == 'sequence':
-                for pos in self.sequence:
-                    if not self.running:
-                        break
-                    pyautogui.click(pos)
-                    time.sleep(self.delay)
-            pyautogui.moveTo(original_position)
+class TaskListModel(QAbstractListModel):
+    # Lista de tasks sem um widget por linha: o nome e o checkbox vêm do modelo,
+    # o estado (disparos, último disparo, taxa de polling) é desenhado pelo
+    # TaskItemDelegate. Ligar/desligar vai para o motor em lote.
+    def __init__(self, main_window):
+        super().__init__()
+        self.main_window = main_window
+        self.tasks = []
+        self.poll_metrics = {}  # task -> métricas do scheduler
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.tasks)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        task = self.tasks[index.row()]
+        if role == Qt.DisplayRole:
+            return task.name
+        if role == Qt.CheckStateRole:
+            return Qt.Checked if task.running else Qt.Unchecked
+        if role == TASK_ROLE:
+            return task
+        if role == TASK_STATUS_ROLE:
+            return self.status_text(task)
+        if role == Qt.ToolTipRole:
+            return f"{task.condition_type} -> {task.action_type}"
+        return None
+
+    def flags(self, index):
+        if not index.isValid():
+            return Qt.NoItemFlags
+        return Qt.ItemIsEnabled | Qt.ItemIsSelectable | Qt.ItemIsUserCheckable
+
+    def setData(self, index, value, role=Qt.EditRole):
+        if role != Qt.CheckStateRole or not index.isValid():
+            return False
+        task = self.tasks[index.row()]
+        engine = self.main_window.engine
+        # O motor registra task_started/task_stopped no log de eventos
+        if value == Qt.Checked:
+            engine.start_tasks([task])
         else:
-            print("Window not selected or invalid.")
-
-    def __str__(self):
-        return f"Task(name={self.name}, condition_type={self.condition_type}, action_type={self.action_type})"
+            engine.stop_tasks([task])
+        self.dataChanged.emit(index, index, [Qt.CheckStateRole])
+        return True
+
+    def status_text(self, task):
+        details = []
+        metrics = self.poll_metrics.get(task)
+        if metrics and metrics['rate_hz']:
+            details.append(f"{metrics['rate_hz']:.1f} Hz")
+        if task.last_burst_rate is not None:
+            details.append(f"{task.last_burst_rate:.1f} cliques/s")
+        if task.fire_count:
+            details.append(f"{task.fire_count} disparos")
+        if task.last_fired is not None:
+            details.append(f"há {time.time() - task.last_fired:.0f} s")
+        return "  ".join(details)
+
+    def add_tasks(self, tasks):
+        if not tasks:
+            return
+        first = len(self.tasks)
+        self.beginInsertRows(QModelIndex(), first, first + len(tasks) - 1)
+        self.tasks.extend(tasks)
+        self.endInsertRows()
+
+    def remove_task(self, task):
+        row = self.tasks.index(task)
+        self.beginRemoveRows(QModelIndex(), row, row)
+        del self.tasks[row]
+        self.endRemoveRows()
+
+    def clear(self):
+        self.beginResetModel()
+        self.tasks = []
+        self.poll_metrics = {}
+        self.endResetModel()
+
+    def task_changed(self, task):
+        index = self.index(self.tasks.index(task))
+        self.dataChanged.emit(index, index)
+
+    def refresh(self, poll_metrics=None):
+        # Um único dataChanged para todas as linhas (estado e checkboxes)
+        if poll_metrics is not None:
+            self.poll_metrics = poll_metrics
+        if self.tasks:
+            self.dataChanged.emit(self.index(0), self.index(len(self.tasks) - 1), [Qt.CheckStateRole, TASK_STATUS_ROLE])
+
+
+class TaskItemDelegate(QStyledItemDelegate):
+    # Checkbox e nome pelo estilo padrão; o estado da task à direita da linha
+    def paint(self, painter, option, index):
+        super().paint(painter, option, index)
+        status = index.data(TASK_STATUS_ROLE)
+        if not status:
+            return
+        painter.save()
+        selected = option.state & QStyle.State_Selected
+        painter.setPen(option.palette.color(QPalette.HighlightedText if selected else QPalette.Dark))
+        painter.drawText(option.rect.adjusted(0, 0, -6, 0), Qt.AlignRight | Qt.AlignVCenter, status)
+        painter.restore()
+
+    def sizeHint(self, option, index):
+        size = super().sizeHint(option, index)
+        status = index.data(TASK_STATUS_ROLE)
+        # Espaço para o estado ao lado do nome
+        extra = option.fontMetrics.horizontalAdvance(status) + 18 if status else 0
+        return QSize(size.width() + extra, max(size.height(), 24))
 
 class TaskEditorWidget(QWidget):
     def __init__(self, main_window, image_label=None):
@@ -289,10 +313,14 @@ class TaskEditorWidget(QWidget):
 
         self.condition_time_radio = QRadioButton("Tempo")
         self.condition_color_radio = QRadioButton("Cor")
+        self.condition_template_radio = QRadioButton("Template (imagem)")
+        self.condition_compound_radio = QRadioButton("Composta (várias cores)")
         self.condition_time_radio.setChecked(True)
         self.condition_group = QButtonGroup()
         self.condition_group.addButton(self.condition_time_radio)
         self.condition_group.addButton(self.condition_color_radio)
+        self.condition_group.addButton(self.condition_template_radio)
+        self.condition_group.addButton(self.condition_compound_radio)
 
         self.time_interval_spin = QDoubleSpinBox()
         self.time_interval_spin.setMinimum(0.1)
@@ -307,14 +335,120 @@ class TaskEditorWidget(QWidget):
         self.color_preview.setFixedSize(50, 50)
         self.color_preview.setStyleSheet("border: 1px solid black;")
 
+        # Tolerância da cor
+        self.tolerance_mode_combo = QComboBox()
+        self.tolerance_mode_combo.addItem("Cor exata", 'exact')
+        self.tolerance_mode_combo.addItem("Distância RGB", 'euclidean')
+        self.tolerance_mode_combo.addItem("Diferença por canal", 'channel')
+        self.tolerance_mode_combo.addItem("Janela de matiz (graus)", 'hue')
+        self.tolerance_mode_combo.setEnabled(False)
+        self.tolerance_spin = QDoubleSpinBox()
+        self.tolerance_spin.setRange(0, 442)
+        self.tolerance_spin.setValue(0)
+        self.tolerance_spin.setEnabled(False)
+
+        # Template
+        self.select_template_button = QPushButton("Selecionar Template")
+        self.select_template_button.setEnabled(False)
+        self.select_template_button.clicked.connect(self.select_template)
+        self.template_preview = QLabel()
+        self.template_preview.setFixedSize(50, 50)
+        self.template_preview.setStyleSheet("border: 1px solid black;")
+        self.select_search_region_button = QPushButton("Selecionar Região de Busca")
+        self.select_search_region_button.setEnabled(False)
+        self.select_search_region_button.clicked.connect(self.select_search_region)
+        self.template_threshold_spin = QDoubleSpinBox()
+        self.template_threshold_spin.setRange(0.5, 1.0)
+        self.template_threshold_spin.setSingleStep(0.01)
+        self.template_threshold_spin.setValue(0.9)
+        self.template_threshold_spin.setEnabled(False)
+        self.template_pixmap = None
+
+        # Polling adaptativo (cor e template)
+        self.poll_min_spin = QDoubleSpinBox()
+        self.poll_min_spin.setDecimals(3)
+        self.poll_min_spin.setRange(0.01, 10.0)
+        self.poll_min_spin.setSingleStep(0.01)
+        self.poll_min_spin.setValue(0.05)
+        self.poll_min_spin.setSuffix(" s")
+        self.poll_max_spin = QDoubleSpinBox()
+        self.poll_max_spin.setDecimals(3)
+        self.poll_max_spin.setRange(0.01, 60.0)
+        self.poll_max_spin.setSingleStep(0.1)
+        self.poll_max_spin.setValue(0.5)
+        self.poll_max_spin.setSuffix(" s")
+        self.poll_min_spin.setEnabled(False)
+        self.poll_max_spin.setEnabled(False)
+
+        # Semântica do disparo (cor, template e composta)
+        self.trigger_mode_combo = QComboBox()
+        self.trigger_mode_combo.addItem("Enquanto verdadeira", 'level')
+        self.trigger_mode_combo.addItem("Borda de subida", 'rising')
+        self.trigger_mode_combo.addItem("Mantida por N verificações", 'hold')
+        self.trigger_mode_combo.setEnabled(False)
+        self.hold_frames_spin = QSpinBox()
+        self.hold_frames_spin.setRange(1, 100)
+        self.hold_frames_spin.setValue(1)
+        self.hold_frames_spin.setSuffix(" verificações")
+        self.hold_frames_spin.setEnabled(False)
+        self.off_tolerance_spin = QDoubleSpinBox()
+        self.off_tolerance_spin.setRange(0, 442)
+        self.off_tolerance_spin.setValue(0)
+        self.off_tolerance_spin.setEnabled(False)
+        self.cooldown_spin = QDoubleSpinBox()
+        self.cooldown_spin.setDecimals(2)
+        self.cooldown_spin.setRange(0, 3600)
+        self.cooldown_spin.setValue(0)
+        self.cooldown_spin.setSuffix(" s")
+        self.cooldown_spin.setEnabled(False)
+
+        # Condição composta: árvore all/any/not de checagens de pixel, em JSON
+        self.compound_edit = QPlainTextEdit()
+        self.compound_edit.setFixedHeight(80)
+        self.compound_edit.setPlaceholderText('{"all": [{"pixel": [x, y], "color": [r, g, b]}, {"not": {...}}]}')
+        self.compound_edit.setEnabled(False)
+        self.add_leaf_button = QPushButton("Adicionar Cor Selecionada")
+        self.add_leaf_button.setEnabled(False)
+        self.add_leaf_button.clicked.connect(lambda: self.add_compound_leaf(negate=False))
+        self.add_not_leaf_button = QPushButton("Adicionar Cor Ausente (NÃO)")
+        self.add_not_leaf_button.setEnabled(False)
+        self.add_not_leaf_button.clicked.connect(lambda: self.add_compound_leaf(negate=True))
+
         condition_layout.addWidget(self.condition_time_radio)
         condition_layout.addWidget(self.time_interval_spin)
         condition_layout.addWidget(self.condition_color_radio)
         condition_layout.addWidget(self.select_color_button)
         condition_layout.addWidget(self.color_preview)
+        condition_layout.addWidget(QLabel("Tolerância:"))
+        condition_layout.addWidget(self.tolerance_mode_combo)
+        condition_layout.addWidget(self.tolerance_spin)
+        condition_layout.addWidget(self.condition_template_radio)
+        condition_layout.addWidget(self.select_template_button)
+        condition_layout.addWidget(self.template_preview)
+        condition_layout.addWidget(self.select_search_region_button)
+        condition_layout.addWidget(QLabel("Score mínimo:"))
+        condition_layout.addWidget(self.template_threshold_spin)
+        condition_layout.addWidget(self.condition_compound_radio)
+        condition_layout.addWidget(self.add_leaf_button)
+        condition_layout.addWidget(self.add_not_leaf_button)
+        condition_layout.addWidget(self.compound_edit)
+        condition_layout.addWidget(QLabel("Intervalo de verificação (mín / máx):"))
+        poll_layout = QHBoxLayout()
+        poll_layout.addWidget(self.poll_min_spin)
+        poll_layout.addWidget(self.poll_max_spin)
+        condition_layout.addLayout(poll_layout)
+        condition_layout.addWidget(QLabel("Disparo:"))
+        condition_layout.addWidget(self.trigger_mode_combo)
+        condition_layout.addWidget(self.hold_frames_spin)
+        condition_layout.addWidget(QLabel("Tolerância para desligar (histerese, 0 = igual):"))
+        condition_layout.addWidget(self.off_tolerance_spin)
+        condition_layout.addWidget(QLabel("Intervalo mínimo entre disparos:"))
+        condition_layout.addWidget(self.cooldown_spin)
         condition_group.setLayout(condition_layout)
 
         self.condition_time_radio.toggled.connect(self.update_condition_inputs)
+        self.condition_template_radio.toggled.connect(self.update_condition_inputs)
+        self.condition_compound_radio.toggled.connect(self.update_condition_inputs)
 
         # Posição
         position_group = QGroupBox("Posição")
@@ -372,6 +506,10 @@ class TaskEditorWidget(QWidget):
         self.sequence_delay_spin.setSuffix(" s")
         self.sequence_delay_spin.setEnabled(False)
 
+        self.priority_spin = QSpinBox()
+        self.priority_spin.setRange(0, 10)
+        self.priority_spin.setValue(0)
+
         action_layout.addWidget(self.action_click_radio)
         action_layout.addWidget(self.action_clicks_radio)
         action_layout.addWidget(QLabel("Frequência:"))
@@ -385,6 +523,8 @@ class TaskEditorWidget(QWidget):
         action_layout.addWidget(self.sequence_positions_list)
         action_layout.addWidget(QLabel("Delay entre cliques:"))
         action_layout.addWidget(self.sequence_delay_spin)
+        action_layout.addWidget(QLabel("Prioridade:"))
+        action_layout.addWidget(self.priority_spin)
         action_group.setLayout(action_layout)
 
         self.action_clicks_radio.toggled.connect(self.update_action_inputs)
@@ -409,12 +549,26 @@ class TaskEditorWidget(QWidget):
         self.setVisible(False)  # Inicialmente oculto
 
     def update_condition_inputs(self):
-        if self.condition_time_radio.isChecked():
-            self.time_interval_spin.setEnabled(True)
-            self.select_color_button.setEnabled(False)
-        else:
-            self.time_interval_spin.setEnabled(False)
-            self.select_color_button.setEnabled(True)
+        is_time = self.condition_time_radio.isChecked()
+        is_color = self.condition_color_radio.isChecked()
+        is_template = self.condition_template_radio.isChecked()
+        is_compound = self.condition_compound_radio.isChecked()
+        self.time_interval_spin.setEnabled(is_time)
+        self.select_color_button.setEnabled(is_color or is_compound)
+        self.tolerance_mode_combo.setEnabled(is_color or is_compound)
+        self.tolerance_spin.setEnabled(is_color or is_compound)
+        self.compound_edit.setEnabled(is_compound)
+        self.add_leaf_button.setEnabled(is_compound)
+        self.add_not_leaf_button.setEnabled(is_compound)
+        self.select_template_button.setEnabled(is_template)
+        self.select_search_region_button.setEnabled(is_template)
+        self.template_threshold_spin.setEnabled(is_template)
+        self.poll_min_spin.setEnabled(not is_time)
+        self.poll_max_spin.setEnabled(not is_time)
+        self.trigger_mode_combo.setEnabled(not is_time)
+        self.hold_frames_spin.setEnabled(not is_time)
+        self.off_tolerance_spin.setEnabled(is_color)
+        self.cooldown_spin.setEnabled(not is_time)
 
     def update_action_inputs(self):
         if self.action_clicks_radio.isChecked():
@@ -456,6 +610,30 @@ class TaskEditorWidget(QWidget):
         self.image_label.selecting_color = True
         self.main_window.status_label.setText("Clique na imagem para selecionar a cor.")
 
+    def select_template(self):
+        if not self.main_window.window_selected:
+            self.main_window.status_label.setText("Selecione uma janela primeiro.")
+            return
+        self.image_label.selecting_template = True
+        self.main_window.status_label.setText("Desenhe na imagem o retângulo do template.")
+
+    def select_search_region(self):
+        if not self.main_window.window_selected:
+            self.main_window.status_label.setText("Selecione uma janela primeiro.")
+            return
+        self.image_label.selecting_search_region = True
+        self.main_window.status_label.setText("Desenhe na imagem a região onde o template será procurado.")
+
+    def update_template_preview(self, rect):
+        pixmap = self.image_label.pixmap()
+        if pixmap and rect.width() > 1 and rect.height() > 1:
+            self.template_pixmap = pixmap.copy(rect)
+            self.template_preview.setPixmap(self.template_pixmap.scaled(50, 50, Qt.KeepAspectRatio))
+            self.main_window.status_label.setText("Template selecionado.")
+
+    def update_search_region_preview(self, rect):
+        self.main_window.status_label.setText(f"Região de busca: {rect.width()}x{rect.height()}")
+
     def select_sequence_positions(self):
         if not self.main_window.window_selected:
             self.main_window.status_label.setText("Selecione uma janela primeiro.")
@@ -476,6 +654,35 @@ class TaskEditorWidget(QWidget):
             item = QListWidgetItem(f"{idx + 1}: ({pos.x()}, {pos.y()})")
             self.sequence_positions_list.addItem(item)
 
+    def add_compound_leaf(self, negate):
+        # Acrescenta a cor/posição selecionada como checagem na lista "all" da árvore
+        if self.selected_color is None or self.color_position is None:
+            self.main_window.status_label.setText("Selecione uma cor primeiro.")
+            return
+        offset_x, offset_y = self.main_window.get_image_offset()
+        leaf = {
+            'pixel': [
+                self.color_position.x() + offset_x,
+                self.color_position.y() + offset_y
+            ],
+            'color': list(self.selected_color),
+            'tolerance_mode': self.tolerance_mode_combo.currentData(),
+            'tolerance': self.tolerance_spin.value()
+        }
+        if negate:
+            leaf = {'not': leaf}
+        text = self.compound_edit.toPlainText().strip()
+        try:
+            tree = json.loads(text) if text else {'all': []}
+        except ValueError:
+            self.main_window.status_label.setText("JSON da condição composta inválido.")
+            return
+        if 'all' not in tree:
+            tree = {'all': [tree]}
+        tree['all'].append(leaf)
+        self.compound_edit.setPlainText(json.dumps(tree))
+        self.main_window.status_label.setText("Checagem adicionada à condição composta.")
+
     def update_color_preview(self, color, position):
         self.selected_color = color
         self.color_position = position
@@ -501,17 +708,39 @@ class TaskEditorWidget(QWidget):
         self.task_name_input.setText(task.name)
         self.condition_time_radio.setChecked(task.condition_type == 'time')
         self.condition_color_radio.setChecked(task.condition_type == 'color')
+        self.condition_template_radio.setChecked(task.condition_type == 'template')
+        self.condition_compound_radio.setChecked(task.condition_type == 'compound')
         if task.condition_type == 'time':
             self.time_interval_spin.setValue(task.condition_value)
+        elif task.condition_type == 'compound':
+            self.compound_edit.setPlainText(json.dumps(task.condition_value))
+        elif task.condition_type == 'template':
+            self.template_threshold_spin.setValue(task.condition_value)
+            self.template_pixmap = None
+            self.image_label.template_rect = None
+            if task.template_path:
+                self.template_preview.setPixmap(QPixmap(task.template_path).scaled(50, 50, Qt.KeepAspectRatio))
+            if task.search_region:
+                offset_x, offset_y = self.main_window.get_image_offset()
+                x, y, width, height = task.search_region
+                self.image_label.search_rect = QRect(
+                    x - offset_x,
+                    y - offset_y,
+                    width, height
+                )
+            else:
+                self.image_label.search_rect = None
         else:
+            self.tolerance_mode_combo.setCurrentIndex(max(0, self.tolerance_mode_combo.findData(task.tolerance_mode)))
+            self.tolerance_spin.setValue(task.tolerance)
             if task.condition_value and task.condition_position:
                 # Ajuste das posições considerando o deslocamento
                 offset_x, offset_y = self.main_window.get_image_offset()
                 self.update_color_preview(
                     task.condition_value,
                     QPoint(
-                        task.condition_position[0] - self.main_window.selected_window.left - offset_x,
-                        task.condition_position[1] - self.main_window.selected_window.top - offset_y
+                        task.condition_position[0] - offset_x,
+                        task.condition_position[1] - offset_y
                     )
                 )
         if task.action_type == 'sequence':
@@ -521,8 +750,8 @@ class TaskEditorWidget(QWidget):
             offset_x, offset_y = self.main_window.get_image_offset()
             for pos in task.sequence:
                 adjusted_pos = QPoint(
-                    pos[0] - self.main_window.selected_window.left - offset_x,
-                    pos[1] - self.main_window.selected_window.top - offset_y
+                    pos[0] - offset_x,
+                    pos[1] - offset_y
                 )
                 self.image_label.sequence_positions.append(adjusted_pos)
             self.update_sequence_preview()
@@ -530,8 +759,8 @@ class TaskEditorWidget(QWidget):
             if task.action_position is not None:
                 offset_x, offset_y = self.main_window.get_image_offset()
                 self.selected_position = QPoint(
-                    task.action_position[0] - self.main_window.selected_window.left - offset_x,
-                    task.action_position[1] - self.main_window.selected_window.top - offset_y
+                    task.action_position[0] - offset_x,
+                    task.action_position[1] - offset_y
                 )
                 self.update_position_preview(self.selected_position)
             else:
@@ -542,6 +771,13 @@ class TaskEditorWidget(QWidget):
             if task.action_type == 'clicks':
                 self.frequency_spin.setValue(task.frequency)
                 self.duration_spin.setValue(task.duration)
+        self.priority_spin.setValue(task.priority)
+        self.poll_min_spin.setValue(task.poll_min)
+        self.poll_max_spin.setValue(task.poll_max)
+        self.trigger_mode_combo.setCurrentIndex(max(0, self.trigger_mode_combo.findData(task.trigger_mode)))
+        self.hold_frames_spin.setValue(task.hold_frames)
+        self.off_tolerance_spin.setValue(task.off_tolerance or 0)
+        self.cooldown_spin.setValue(task.cooldown)
         self.setVisible(True)
 
     def save_task(self):
@@ -550,11 +786,52 @@ class TaskEditorWidget(QWidget):
             QMessageBox.warning(self, "Erro", "Nome da Task não pode estar vazio.")
             return
 
-        condition_type = 'time' if self.condition_time_radio.isChecked() else 'color'
+        if self.condition_time_radio.isChecked():
+            condition_type = 'time'
+        elif self.condition_template_radio.isChecked():
+            condition_type = 'template'
+        elif self.condition_compound_radio.isChecked():
+            condition_type = 'compound'
+        else:
+            condition_type = 'color'
+        tolerance_mode = 'exact'
+        tolerance = 0
+        template_path = None
+        search_region = None
         if condition_type == 'time':
             condition_value = self.time_interval_spin.value()
             condition_position = None
+        elif condition_type == 'compound':
+            try:
+                from conditions import compile_condition_tree
+                condition_value = json.loads(self.compound_edit.toPlainText())
+                compile_condition_tree(condition_value, [])
+            except (ValueError, TypeError) as e:
+                QMessageBox.warning(self, "Erro", f"Condição composta inválida: {e}")
+                return
+            condition_position = None
+        elif condition_type == 'template':
+            if self.template_pixmap is None and not (self.task and self.task.template_path):
+                QMessageBox.warning(self, "Erro", "Por favor, selecione o template.")
+                return
+            condition_value = self.template_threshold_spin.value()
+            condition_position = None
+            if self.template_pixmap is not None:
+                template_path = self.main_window.save_template_image(name, self.template_pixmap)
+            else:
+                template_path = self.task.template_path
+            search_rect = self.image_label.search_rect
+            if search_rect:
+                offset_x, offset_y = self.main_window.get_image_offset()
+                search_region = (
+                    search_rect.x() + offset_x,
+                    search_rect.y() + offset_y,
+                    search_rect.width(),
+                    search_rect.height()
+                )
         else:
+            tolerance_mode = self.tolerance_mode_combo.currentData()
+            tolerance = self.tolerance_spin.value()
             if self.selected_color is None or self.color_position is None:
                 QMessageBox.warning(self, "Erro", "Por favor, selecione a cor e a posição.")
                 return
@@ -562,8 +839,8 @@ class TaskEditorWidget(QWidget):
             # Ajustar a posição considerando o offset da área selecionada
             offset_x, offset_y = self.main_window.get_image_offset()
             condition_position = (
-                self.color_position.x() + self.main_window.selected_window.left + offset_x,
-                self.color_position.y() + self.main_window.selected_window.top + offset_y
+                self.color_position.x() + offset_x,
+                self.color_position.y() + offset_y
             )
 
         # Ajustar a posição para ações que não são sequência
@@ -577,8 +854,8 @@ class TaskEditorWidget(QWidget):
             offset_x, offset_y = self.main_window.get_image_offset()
             for pos in self.image_label.sequence_positions:
                 window_pos = (
-                    pos.x() + self.main_window.selected_window.left + offset_x,
-                    pos.y() + self.main_window.selected_window.top + offset_y
+                    pos.x() + offset_x,
+                    pos.y() + offset_y
                 )
                 sequence.append(window_pos)
             delay = self.sequence_delay_spin.value()
@@ -589,14 +866,22 @@ class TaskEditorWidget(QWidget):
             action_type = 'click' if self.action_click_radio.isChecked() else 'clicks'
             offset_x, offset_y = self.main_window.get_image_offset()
             action_position = (
-                self.selected_position.x() + self.main_window.selected_window.left + offset_x,
-                self.selected_position.y() + self.main_window.selected_window.top + offset_y
+                self.selected_position.x() + offset_x,
+                self.selected_position.y() + offset_y
             )
             sequence = None
             delay = None
 
         frequency = self.frequency_spin.value() if self.action_clicks_radio.isChecked() else None
         duration = self.duration_spin.value() if self.action_clicks_radio.isChecked() else None
+        priority = self.priority_spin.value()
+        poll_min = self.poll_min_spin.value()
+        poll_max = max(self.poll_max_spin.value(), poll_min)
+        trigger_mode = self.trigger_mode_combo.currentData()
+        hold_frames = self.hold_frames_spin.value()
+        off_tolerance = self.off_tolerance_spin.value() if condition_type == 'color' else 0
+        off_tolerance = off_tolerance if off_tolerance > tolerance else None
+        cooldown = self.cooldown_spin.value()
 
         # Criar ou atualizar a task
         if self.task:
@@ -610,19 +895,31 @@ class TaskEditorWidget(QWidget):
             self.task.duration = duration
             self.task.sequence = sequence
             self.task.delay = delay
+            self.task.priority = priority
+            self.task.tolerance_mode = tolerance_mode
+            self.task.tolerance = tolerance
+            self.task.template_path = template_path
+            self.task.search_region = search_region
+            self.task.poll_min = poll_min
+            self.task.poll_max = poll_max
+            self.task.trigger_mode = trigger_mode
+            self.task.hold_frames = hold_frames
+            self.task.off_tolerance = off_tolerance
+            self.task.cooldown = cooldown
+            self.main_window.engine.update_task(self.task)
+            self.main_window.task_model.task_changed(self.task)
             self.main_window.status_label.setText("Task editada.")
         else:
+            from engine import Task
             new_task = Task(
                 name, condition_type, condition_value, condition_position,
-                action_type, action_position, frequency, duration, sequence, delay, self.main_window
+                action_type, action_position, frequency, duration, sequence, delay, self.main_window.engine,
+                priority, tolerance_mode, tolerance, template_path, search_region, poll_min, poll_max,
+                trigger_mode, hold_frames, off_tolerance, cooldown
             )
             self.main_window.tasks.append(new_task)
-            task_item = TaskItem(new_task, self.main_window)
-            list_item = QListWidgetItem()
-            list_item.setSizeHint(task_item.sizeHint())
-            self.main_window.task_list_widget.addItem(list_item)
-            self.main_window.task_list_widget.setItemWidget(list_item, task_item)
-            task_item.list_item = list_item
+            self.main_window.task_model.add_tasks([new_task])
+            self.main_window.autosave = True
             self.main_window.status_label.setText("Task criada e adicionada à lista.")
 
         self.reset_fields()
@@ -637,6 +934,21 @@ class TaskEditorWidget(QWidget):
         self.selected_color = None
         self.color_preview.setStyleSheet("border: 1px solid black;")
         self.color_position = None
+        self.priority_spin.setValue(0)
+        self.tolerance_mode_combo.setCurrentIndex(0)
+        self.tolerance_spin.setValue(0)
+        self.template_pixmap = None
+        self.template_preview.clear()
+        self.poll_min_spin.setValue(0.05)
+        self.poll_max_spin.setValue(0.5)
+        self.trigger_mode_combo.setCurrentIndex(0)
+        self.hold_frames_spin.setValue(1)
+        self.off_tolerance_spin.setValue(0)
+        self.cooldown_spin.setValue(0)
+        self.compound_edit.clear()
+        self.image_label.template_rect = None
+        self.image_label.search_rect = None
+        self.image_label.update()
         
     def cancel_task(self):
         self.setVisible(False)
@@ -649,6 +961,120 @@ class TaskEditorWidget(QWidget):
         self.position_preview.clear()
         self.selected_color = None
         self.color_preview.setStyleSheet("border: 1px solid black;")
+        self.priority_spin.setValue(0)
+        self.tolerance_mode_combo.setCurrentIndex(0)
+        self.tolerance_spin.setValue(0)
+        self.template_pixmap = None
+        self.template_preview.clear()
+        self.poll_min_spin.setValue(0.05)
+        self.poll_max_spin.setValue(0.5)
+        self.trigger_mode_combo.setCurrentIndex(0)
+        self.hold_frames_spin.setValue(1)
+        self.off_tolerance_spin.setValue(0)
+        self.cooldown_spin.setValue(0)
+        self.compound_edit.clear()
+        self.image_label.template_rect = None
+        self.image_label.search_rect = None
+        self.image_label.update()
+
+class PreviewWorker(QObject):
+    # Captura da prévia ao vivo em uma thread própria. Guarda só o frame mais
+    # novo; se a GUI ainda não consumiu o anterior, ele é descartado e contado.
+    frame_ready = pyqtSignal()
+
+    def __init__(self, region_provider, backend, fps=15, errors=None):
+        super().__init__()
+        self.region_provider = region_provider
+        self.backend = backend
+        self.errors = errors or ErrorReporter()
+        self.fps = fps
+        self.latest = None
+        self.dropped_frames = 0
+        self.running = False
+        self.thread = None
+        self.lock = threading.Lock()
+
+    def start(self):
+        if not self.running:
+            self.running = True
+            self.thread = threading.Thread(target=self.run, daemon=True)
+            self.thread.start()
+
+    def stop(self):
+        self.running = False
+        with self.lock:
+            self.latest = None
+
+    def run(self):
+        while self.running and self.thread is threading.current_thread():
+            start = time.monotonic()
+            region = self.region_provider()
+            if region:
+                try:
+                    qimage = array_to_qimage(self.backend.grab(region))
+                except Exception as e:
+                    self.errors.error('preview', f"Erro na captura da prévia: {e}")
+                else:
+                    self.errors.clear('preview')
+                    with self.lock:
+                        was_empty = self.latest is None
+                        if not was_empty:
+                            self.dropped_frames += 1
+                        self.latest = qimage
+                    # Só avisa a GUI quando o slot estava vazio, para não encher a fila de eventos
+                    if was_empty:
+                        self.frame_ready.emit()
+            time.sleep(max(0, 1 / self.fps - (time.monotonic() - start)))
+
+    def take_frame(self):
+        with self.lock:
+            frame, self.latest = self.latest, None
+        return frame
+
+class EngineLoader(QObject):
+    # Importa o motor (e o NumPy), cria o Engine e lê o último perfil fora da
+    # thread da GUI; ready é emitido quando tudo estiver pronto
+    ready = pyqtSignal()
+
+    def __init__(self, script_dir, profile_path):
+        super().__init__()
+        self.script_dir = script_dir
+        self.profile_path = profile_path
+        self.engine = None
+        self.tasks = []
+        self.error = None
+        self.pending_profile = None  # Perfil antigo à espera da janela
+        self.timer = StartupTimer()
+
+    def start(self):
+        threading.Thread(target=self.run, daemon=True).start()
+
+    def run(self):
+        self.timer = StartupTimer()
+        # ready é sempre emitido, mesmo com erro, para a GUI não ficar presa em "Carregando..."
+        try:
+            from engine import Engine
+            from geometry import LegacyProfileError
+            self.timer.mark("import do motor")
+            self.engine = Engine(
+                os.environ.get('AUTOPLAY_CAPTURE', 'auto'), os.environ.get('AUTOPLAY_INPUT', 'auto'),
+                os.path.join(self.script_dir, 'logs', 'events.jsonl'), self.script_dir
+            )
+            self.timer.mark("motor")
+            try:
+                self.tasks = self.engine.load_profile(self.profile_path)
+            except FileNotFoundError:
+                pass
+            except LegacyProfileError as e:
+                # Convertido quando a janela for selecionada
+                self.pending_profile = e.path
+                self.error = str(e)
+            self.timer.mark("perfil")
+        except Exception as e:
+            self.error = f"Erro ao iniciar: {e}" if self.engine is None else str(e)
+            print(self.error)
+        finally:
+            self.ready.emit()
 
 class ClickableLabel(QLabel):
     clicked = pyqtSignal()
@@ -662,21 +1088,31 @@ class MainWindow(QMainWindow):
         super().__init__()
         # Set program icon
         script_dir = os.path.dirname(os.path.realpath(__file__))
+        self.script_dir = script_dir
         icon_path = os.path.join(script_dir, 'resources', 'gato.png')
         self.setWindowIcon(QIcon(icon_path))
         self.setWindowTitle("Chico player")
-        self.selected_window = None
+        # Motor sem GUI (engine.py): janela alvo, captura, entrada, scheduler e
+        # tasks. Fica None até o EngineLoader terminar (start_engine).
+        self.engine = None
+        self.engine_loader = None
+        self.preview_worker = None
+        # Se o perfil inicial não carregou, tasks.json não é sobrescrito ao
+        # fechar até o usuário carregar ou criar tasks
+        self.autosave = True
+        self.pending_profile = None
         self.window_selected = False
-        self.selected_area = None
         self.image_label = ImageLabel(self)
-        self.tasks = []
         self.updating = False
+        self.preview_fps = 15
 
         self.task_editor = TaskEditorWidget(self, self.image_label)
         self.initUI()
 
-        self.timer = QTimer()
-        self.timer.timeout.connect(self.update_screenshot)
+        # Atualiza o estado exibido em cada task (polling, disparos)
+        self.metrics_timer = QTimer()
+        self.metrics_timer.timeout.connect(self.update_task_metrics)
+        self.metrics_timer.start(1000)
 
         # Audio playback timer
         self.audio_timer = QTimer()
@@ -689,6 +1125,7 @@ class MainWindow(QMainWindow):
 
         self.select_window_button = QPushButton("Selecionar Tela")
         self.select_window_button.clicked.connect(self.select_window)
+        self.select_window_button.setEnabled(False)  # Habilitado quando o motor estiver pronto
 
         self.select_area_button = QPushButton("Selecionar Área")
         self.select_area_button.clicked.connect(self.select_area)
@@ -710,6 +1147,13 @@ class MainWindow(QMainWindow):
         self.live_update_button.clicked.connect(self.toggle_live_update)
         self.live_update_button.setEnabled(False)
 
+        self.preview_fps_spin = QSpinBox()
+        self.preview_fps_spin.setRange(1, 60)
+        self.preview_fps_spin.setValue(self.preview_fps)
+        self.preview_fps_spin.setSuffix(" FPS")
+        self.preview_fps_spin.valueChanged.connect(self.set_preview_fps)
+        self.preview_stats_label = QLabel("")
+
         # Buttons to start and stop all tasks
         self.start_all_button = QPushButton("Iniciar Todas as Tasks")
         self.start_all_button.clicked.connect(self.start_all_tasks)
@@ -722,15 +1166,45 @@ class MainWindow(QMainWindow):
         # Buttons to save and load profiles
         self.save_profile_button = QPushButton("Salvar Perfil")
         self.save_profile_button.clicked.connect(self.save_profile)
+        self.save_profile_button.setEnabled(False)
         self.load_profile_button = QPushButton("Carregar Perfil")
         self.load_profile_button.clicked.connect(self.load_profile)
+        self.load_profile_button.setEnabled(False)
 
         # Task Editor
         self.task_editor = TaskEditorWidget(self, self.image_label)
         self.task_editor.setVisible(False)
 
-        # Task list
-        self.task_list_widget = QListWidget()
+        # Lista de tasks: modelo + delegate, sem widgets por linha
+        self.task_model = TaskListModel(self)
+        self.task_list_view = QListView()
+        self.task_list_view.setModel(self.task_model)
+        self.task_list_view.setItemDelegate(TaskItemDelegate(self.task_list_view))
+        self.task_list_view.setUniformItemSizes(True)
+        self.task_list_view.doubleClicked.connect(self.edit_selected_task)
+        self.edit_task_button = QPushButton("Editar")
+        self.edit_task_button.clicked.connect(self.edit_selected_task)
+        self.delete_task_button = QPushButton("Excluir")
+        self.delete_task_button.clicked.connect(self.delete_selected_task)
+
+        # Painel de métricas por estágio, ao lado da lista de tasks
+        self.metrics_label = QLabel("Sem medições ainda.")
+        self.metrics_label.setStyleSheet("font-family: monospace;")
+        self.export_metrics_json_button = QPushButton("Exportar JSON")
+        self.export_metrics_json_button.clicked.connect(lambda: self.export_metrics('json'))
+        self.export_metrics_csv_button = QPushButton("Exportar CSV")
+        self.export_metrics_csv_button.clicked.connect(lambda: self.export_metrics('csv'))
+        self.clear_metrics_button = QPushButton("Limpar")
+        self.clear_metrics_button.clicked.connect(self.clear_metrics)
+        metrics_box = QGroupBox("Métricas (ms)")
+        metrics_layout = QVBoxLayout()
+        metrics_layout.addWidget(self.metrics_label)
+        metrics_buttons_layout = QHBoxLayout()
+        metrics_buttons_layout.addWidget(self.export_metrics_json_button)
+        metrics_buttons_layout.addWidget(self.export_metrics_csv_button)
+        metrics_buttons_layout.addWidget(self.clear_metrics_button)
+        metrics_layout.addLayout(metrics_buttons_layout)
+        metrics_box.setLayout(metrics_layout)
 
         # Layouts
         main_layout = QHBoxLayout()
@@ -746,12 +1220,23 @@ class MainWindow(QMainWindow):
         left_layout.addWidget(self.create_task_button)
         left_layout.addWidget(self.update_sample_button)
         left_layout.addWidget(self.live_update_button)
+        left_layout.addWidget(self.preview_fps_spin)
+        left_layout.addWidget(self.preview_stats_label)
         left_layout.addWidget(self.start_all_button)
         left_layout.addWidget(self.stop_all_button)
         left_layout.addWidget(self.save_profile_button)
         left_layout.addWidget(self.load_profile_button)
         left_layout.addWidget(QLabel("Tasks:"))
-        left_layout.addWidget(self.task_list_widget)
+        tasks_layout = QHBoxLayout()
+        task_list_layout = QVBoxLayout()
+        task_list_layout.addWidget(self.task_list_view)
+        task_buttons_layout = QHBoxLayout()
+        task_buttons_layout.addWidget(self.edit_task_button)
+        task_buttons_layout.addWidget(self.delete_task_button)
+        task_list_layout.addLayout(task_buttons_layout)
+        tasks_layout.addLayout(task_list_layout)
+        tasks_layout.addWidget(metrics_box)
+        left_layout.addLayout(tasks_layout)
         left_layout.addWidget(self.status_label)
         left_layout.addStretch()
 
@@ -798,9 +1283,8 @@ class MainWindow(QMainWindow):
     def get_image_offset(self):
         if self.selected_area:
             area_x, area_y, _, _ = self.selected_area
-            offset_x = area_x - self.selected_window.left
-            offset_y = area_y - self.selected_window.top
-            return offset_x, offset_y
+            # A área já é relativa à janela
+            return area_x, area_y
         else:
             return 0, 0
 
@@ -808,9 +1292,10 @@ class MainWindow(QMainWindow):
         dialog = SelectWindowDialog(self)
         if dialog.exec_() == QDialog.Accepted:
             self.selected_window_title = dialog.selected_window
-            window = gw.getWindowsWithTitle(self.selected_window_title)
+            from engine import find_window
+            window = find_window(self.selected_window_title)
             if window:
-                self.selected_window = window[0]
+                self.engine.set_window(window)
                 self.window_selected = True
                 self.selected_window.activate()
                 self.update_screenshot()
@@ -821,29 +1306,66 @@ class MainWindow(QMainWindow):
                 self.image_label.setEnabled(True)
                 self.start_all_button.setEnabled(True)
                 self.stop_all_button.setEnabled(True)
+                if self.pending_profile:
+                    # Perfil antigo do início: converte pela origem da janela agora conhecida
+                    profile_path, self.pending_profile = self.pending_profile, None
+                    if self.load_tasks(profile_path, replace=True):
+                        self.status_label.setText(f"Perfil carregado de {profile_path}")
             else:
                 self.status_label.setText("Error selecting window.")
 
+    # Janela, área e tasks vivem no Engine; a GUI só lê e escreve por aqui
+    @property
+    def selected_window(self):
+        return self.engine.selected_window
+
+    @property
+    def selected_area(self):
+        return self.engine.selected_area
+
+    @selected_area.setter
+    def selected_area(self, area):
+        self.engine.selected_area = area
+
+    @property
+    def tasks(self):
+        return self.engine.tasks
+
+    @tasks.setter
+    def tasks(self, tasks):
+        self.engine.tasks = tasks
+
+    def get_capture_region(self):
+        return self.engine.get_capture_region()
+
     def update_screenshot(self):
-        if self.selected_window:
-            window = self.selected_window
-            if self.selected_area:
-                region = self.selected_area  # (x, y, width, height)
-            else:
-                region = (window.left, window.top, window.width, window.height)
-            screenshot = pyautogui.screenshot(region=region)
-            screenshot.save("window_screenshot.png")
-            pixmap = QPixmap("window_screenshot.png")
-            self.image_label.setPixmap(pixmap)
-            self.image_label.setFixedSize(pixmap.size())
+        region = self.get_capture_region()
+        if region:
+            self.set_preview_pixmap(array_to_pixmap(self.capture_backend.grab(region)))
+
+    def set_preview_pixmap(self, pixmap):
+        self.image_label.setPixmap(pixmap)
+        self.image_label.setFixedSize(pixmap.size())
+
+    def show_preview_frame(self):
+        # Slot da GUI: pega o frame mais novo produzido pelo PreviewWorker
+        frame = self.preview_worker.take_frame()
+        if frame is not None and self.updating:
+            self.set_preview_pixmap(QPixmap.fromImage(frame))
+            self.preview_stats_label.setText(f"Frames descartados: {self.preview_worker.dropped_frames}")
+
+    def set_preview_fps(self, fps):
+        self.preview_fps = fps
+        if self.preview_worker:
+            self.preview_worker.fps = fps
 
     def toggle_live_update(self):
         if not self.updating:
-            self.timer.start(66)
+            self.preview_worker.start()
             self.updating = True
             self.live_update_button.setText("Parar Atualização Constante")
         else:
-            self.timer.stop()
+            self.preview_worker.stop()
             self.updating = False
             self.live_update_button.setText("Iniciar Atualização Constante")
 
@@ -861,11 +1383,9 @@ class MainWindow(QMainWindow):
             y = selected_rect.top()
             width = selected_rect.width()
             height = selected_rect.height()
-            window_x = x + self.selected_window.left
-            window_y = y + self.selected_window.top
-            window_width = width
-            window_height = height
-            self.selected_area = (window_x, window_y, window_width, window_height)
+            # Guardada relativa à janela: continua valendo se a janela mover
+            self.selected_area = (x, y, width, height)
+            self.frame_capture.invalidate()
             self.create_task_button.setEnabled(True)
             self.status_label.setText("Area selected.")
             self.update_screenshot()
@@ -881,76 +1401,99 @@ class MainWindow(QMainWindow):
         self.status_label.setText("Configure the task and click 'Save'.")
 
     def closeEvent(self, event):
-        for task in self.tasks:
-            task.stop()
-        self.save_tasks()
+        if self.engine is None:
+            # Fechado antes do motor ficar pronto: não há tasks para salvar
+            event.accept()
+            return
+        self.engine.stop_all()
+        self.preview_worker.stop()
+        if self.autosave:
+            self.save_tasks()
+        self.engine.close()
         event.accept()
 
+    def start_engine(self, profile_path='tasks.json'):
+        # Monta o motor e carrega o último perfil numa thread, com a janela já visível
+        self.status_label.setText("Carregando...")
+        self.engine_loader = EngineLoader(self.script_dir, profile_path)
+        self.engine_loader.ready.connect(self.on_engine_ready)
+        self.engine_loader.start()
+
+    def on_engine_ready(self):
+        loader = self.engine_loader
+        if loader.engine is None:
+            # O motor não subiu: só mostra o erro; closeEvent não salva nada
+            self.status_label.setText(loader.error)
+            return
+        self.engine = loader.engine
+        self.capture_backend = self.engine.capture_backend
+        self.geometry = self.engine.geometry
+        self.metrics = self.engine.metrics
+        self.frame_capture = self.engine.frame_capture
+        self.input_backend = self.engine.input_backend
+        self.scheduler = self.engine.scheduler
+        self.preview_worker = PreviewWorker(
+            self.get_capture_region, self.capture_backend, self.preview_fps, self.engine.errors
+        )
+        self.preview_worker.frame_ready.connect(self.show_preview_frame)
+        self.select_window_button.setEnabled(True)
+        self.save_profile_button.setEnabled(True)
+        self.load_profile_button.setEnabled(True)
+        self.status_label.setText(loader.error or "")
+        self.pending_profile = loader.pending_profile
+        self.autosave = loader.error is None
+        if loader.tasks:
+            self.add_task_items(loader.tasks)
+        STARTUP_TIMER.mark("espera do motor")
+        report = f"{STARTUP_TIMER.report()}; {loader.timer.report('Em segundo plano')}"
+        print(report)
+        if self.engine.event_log:
+            self.engine.event_log.emit(
+                'startup', phases=dict(STARTUP_TIMER.phases), background=dict(loader.timer.phases)
+            )
+
     def save_tasks(self, file_path='tasks.json'):
-        tasks_data = []
-        for task in self.tasks:
-            # Converte a cor de condição para uma tupla, se necessário
-            condition_value = task.condition_value
-            if isinstance(condition_value, list):
-                condition_value = tuple(condition_value)  # Converte lista para tupla
-
-            tasks_data.append({
-                'name': task.name,
-                'condition_type': task.condition_type,
-                'condition_value': condition_value,
-                'condition_position': task.condition_position,
-                'action_type': task.action_type,
-                'action_position': task.action_position,
-                'frequency': task.frequency,
-                'duration': task.duration,
-                'sequence': task.sequence,
-                'delay': task.delay
-            })
-        data = {
-            'tasks': tasks_data,
-            'selected_area': self.selected_area
-        }
-        with open(file_path, 'w') as file:
-            json.dump(data, file, indent=4)
+        self.engine.save_profile(file_path)
 
-    def load_tasks(self, file_path='tasks.json'):
+    def load_tasks(self, file_path='tasks.json', replace=False):
+        # A lista atual só muda se o perfil carregar; um erro a deixa intacta e
+        # desliga o autosave, como no início, para tasks.json não ser sobrescrito
+        from geometry import LegacyProfileError
         try:
-            with open(file_path, 'r') as file:
-                data = json.load(file)
-                tasks_data = data.get('tasks', [])
-                self.selected_area = data.get('selected_area')
-                self.update_screenshot()
-                for task_data in tasks_data:
-                    # Converte a cor de condição para uma tupla, se estiver em formato de lista
-                    condition_value = task_data['condition_value']
-                    if isinstance(condition_value, list):
-                        condition_value = tuple(condition_value)
-
-                    task = Task(
-                        task_data['name'],
-                        task_data['condition_type'],
-                        condition_value,
-                        tuple(task_data['condition_position']) if task_data['condition_position'] else None,
-                        task_data['action_type'],
-                        tuple(task_data['action_position']) if task_data['action_position'] else None,
-                        task_data.get('frequency'),
-                        task_data.get('duration'),
-                        task_data.get('sequence'),
-                        task_data.get('delay'),
-                        self
-                    )
-                    self.tasks.append(task)
-                    task_item = TaskItem(task, self)
-                    list_item = QListWidgetItem()
-                    list_item.setSizeHint(task_item.sizeHint())
-                    self.task_list_widget.addItem(list_item)
-                    self.task_list_widget.setItemWidget(list_item, task_item)
-                    task_item.list_item = list_item
-                self.create_task_button.setEnabled(True)
-                self.start_all_button.setEnabled(True)
-                self.stop_all_button.setEnabled(True)
+            tasks = self.engine.load_profile(file_path, replace)
         except FileNotFoundError:
-            pass
+            return False
+        except LegacyProfileError:
+            # Perfil antigo sem janela: carregado quando a janela for selecionada
+            self.pending_profile = file_path
+            self.autosave = False
+            self.status_label.setText("Perfil antigo: será carregado quando a janela for selecionada.")
+            return False
+        except ValueError as e:
+            self.autosave = False
+            self.status_label.setText(str(e))
+            return False
+        if replace:
+            self.task_model.clear()
+        self.update_screenshot()
+        self.add_task_items(tasks)
+        self.autosave = True
+        return True
+
+    def add_task_items(self, tasks):
+        self.task_model.add_tasks(tasks)
+        self.create_task_button.setEnabled(True)
+        self.start_all_button.setEnabled(True)
+        self.stop_all_button.setEnabled(True)
+
+    def save_template_image(self, name, pixmap):
+        templates_dir = os.path.join(self.script_dir, 'templates')
+        if not os.path.exists(templates_dir):
+            os.makedirs(templates_dir)
+        safe_name = "".join(c if c.isalnum() else "_" for c in name)
+        file_path = os.path.join(templates_dir, f"{safe_name}_{int(time.time() * 1000)}.png")
+        pixmap.save(file_path, "PNG")
+        return file_path
 
     def save_profile(self):
         profiles_dir = os.path.join(os.path.dirname(__file__), 'profiles')
@@ -973,26 +1516,65 @@ class MainWindow(QMainWindow):
         options |= QFileDialog.DontUseNativeDialog
         file_path, _ = QFileDialog.getOpenFileName(self, "Carregar Perfil", profiles_dir, "JSON Files (*.json)", options=options)
         if file_path:
-            # Stop all tasks before loading new ones
-            self.stop_all_tasks()
-            self.tasks = []
-            self.task_list_widget.clear()
-            self.load_tasks(file_path)
-            self.status_label.setText(f"Perfil carregado de {file_path}")
+            # As tasks atuais são paradas e trocadas só depois que o novo perfil compilar
+            if self.load_tasks(file_path, replace=True):
+                self.status_label.setText(f"Perfil carregado de {file_path}")
 
     def start_all_tasks(self):
-        for i in range(self.task_list_widget.count()):
-            item = self.task_list_widget.item(i)
-            task_item = self.task_list_widget.itemWidget(item)
-            if not task_item.checkbox.isChecked():
-                task_item.checkbox.setChecked(True)
+        # Um único lote para o motor em vez de um checkbox por vez
+        if self.engine is not None:
+            self.engine.start_all()
+            self.task_model.refresh()
 
     def stop_all_tasks(self):
-        for i in range(self.task_list_widget.count()):
-            item = self.task_list_widget.item(i)
-            task_item = self.task_list_widget.itemWidget(item)
-            if task_item.checkbox.isChecked():
-                task_item.checkbox.setChecked(False)
+        if self.engine is not None:
+            self.engine.stop_all()
+            self.task_model.refresh()
+
+    def selected_task(self):
+        index = self.task_list_view.currentIndex()
+        return index.data(TASK_ROLE) if index.isValid() else None
+
+    def edit_selected_task(self):
+        task = self.selected_task()
+        if task is not None:
+            self.task_editor.edit_task(task)
+
+    def delete_selected_task(self):
+        task = self.selected_task()
+        if task is None:
+            return
+        self.engine.stop_tasks([task])
+        self.tasks.remove(task)
+        self.task_model.remove_task(task)
+        self.status_label.setText(f"Task '{task.name}' excluída.")
+
+    def update_task_metrics(self):
+        if self.engine is None:
+            return
+        # Taxa de polling, disparos e último disparo, redesenhados pelo delegate
+        self.task_model.refresh(self.scheduler.metrics())
+        self.metrics_label.setText(self.metrics.format_summary())
+
+    def clear_metrics(self):
+        if self.engine is not None:
+            self.metrics.clear()
+
+    def export_metrics(self, file_format):
+        if self.engine is None:
+            return
+        options = QFileDialog.Options()
+        options |= QFileDialog.DontUseNativeDialog
+        file_filter = "JSON Files (*.json)" if file_format == 'json' else "CSV Files (*.csv)"
+        file_path, _ = QFileDialog.getSaveFileName(self, "Exportar Métricas", self.script_dir, file_filter, options=options)
+        if file_path:
+            if not file_path.endswith('.' + file_format):
+                file_path += '.' + file_format
+            if file_format == 'json':
+                self.metrics.export_json(file_path)
+            else:
+                self.metrics.export_csv(file_path)
+            self.status_label.setText(f"Métricas exportadas para {file_path}")
 
     def schedule_next_audio(self):
         # Schedule the next audio playback
@@ -1004,6 +1586,7 @@ class MainWindow(QMainWindow):
         times = random.randint(1, 2)
         script_dir = os.path.dirname(os.path.realpath(__file__))
         audio_path = os.path.join(script_dir, 'resources', 'meow.mp3')
+        from playsound import playsound
         for _ in range(times):
             playsound(audio_path)
             time.sleep(0.5)  # Slight delay between plays
@@ -1012,11 +1595,16 @@ class MainWindow(QMainWindow):
     def play_meow_sound(self):
         script_dir = os.path.dirname(os.path.realpath(__file__))
         audio_path = os.path.join(script_dir, 'resources', 'meow.mp3')
+        from playsound import playsound
         threading.Thread(target=playsound, args=(audio_path,), daemon=True).start()
 
 
 if __name__ == "__main__":
     app = QApplication(sys.argv)
+    STARTUP_TIMER.mark("QApplication")
     mainWin = MainWindow()
+    STARTUP_TIMER.mark("interface")
     mainWin.show()
+    STARTUP_TIMER.mark("show")
+    mainWin.start_engine()
     sys.exit(app.exec_())
@@ -0,0 +1,238 @@
+import hashlib
+import json
+import os
+
+from conditions import TOLERANCE_MODES, compile_condition_tree
+from geometry import WINDOW_COORDINATES, LegacyProfileError, convert_legacy_profile
+from scheduler import TRIGGER_MODES
+
+# Compilador de perfis: valida e normaliza o JSON uma vez e guarda o resultado
+# em <perfil>.cache, ao lado do arquivo. O cache vale enquanto o hash do JSON
+# (e a versão do compilador) não mudar.
+
+COMPILER_VERSION = 1
+CACHE_SUFFIX = '.cache'
+CONDITION_TYPES = ('time', 'color', 'template', 'compound')
+ACTION_TYPES = ('click', 'clicks', 'sequence')
+
+
+class ProfileError(ValueError):
+    def __init__(self, path, errors):
+        self.path = path
+        self.errors = errors
+        super().__init__(f"Perfil inválido ({os.path.basename(path)}):\n" + "\n".join(f"- {e}" for e in errors))
+
+
+def is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def is_point(value):
+    return isinstance(value, (list, tuple)) and len(value) == 2 and all(is_number(v) for v in value)
+
+
+def is_region(value):
+    return (isinstance(value, (list, tuple)) and len(value) == 4 and all(is_number(v) for v in value)
+            and value[2] > 0 and value[3] > 0)
+
+
+def is_color(value):
+    return (isinstance(value, (list, tuple)) and len(value) == 3
+            and all(isinstance(v, int) and 0 <= v <= 255 for v in value))
+
+
+def point(value):
+    return [int(value[0]), int(value[1])]
+
+
+def check_condition_leaves(leaves):
+    # Erros de cada folha de uma condição composta já compilada
+    errors = []
+    for position, color, (mode, tolerance) in leaves:
+        if not is_point(position):
+            errors.append(f"posição inválida na condição composta: {list(position)}")
+        if not is_color(list(color)):
+            errors.append(f"cor inválida na condição composta: {list(color)}")
+        if mode not in TOLERANCE_MODES:
+            errors.append(f"tolerance_mode desconhecido na condição composta: {mode}")
+    return errors
+
+
+def normalize_task(data, index, errors):
+    # Retorna o dicionário da task com todos os campos e defaults preenchidos;
+    # problemas vão para errors como "task N 'nome': ..."
+    label = f"task {index} '{data.get('name')}'" if isinstance(data, dict) else f"task {index}"
+    if not isinstance(data, dict):
+        errors.append(f"{label}: não é um objeto")
+        return None
+
+    def error(message):
+        errors.append(f"{label}: {message}")
+
+    if not isinstance(data.get('name'), str) or not data['name'].strip():
+        error("nome vazio")
+    condition_type = data.get('condition_type')
+    action_type = data.get('action_type')
+    task = {
+        'name': data.get('name'),
+        'condition_type': condition_type,
+        'condition_value': data.get('condition_value'),
+        'condition_position': None,
+        'action_type': action_type,
+        'action_position': None,
+        'frequency': data.get('frequency'),
+        'duration': data.get('duration'),
+        'sequence': None,
+        'delay': data.get('delay'),
+        'priority': data.get('priority', 0),
+        'tolerance_mode': data.get('tolerance_mode', 'exact'),
+        'tolerance': data.get('tolerance', 0),
+        'template_path': data.get('template_path'),
+        'search_region': None,
+        'poll_min': data.get('poll_min', 0.05),
+        'poll_max': data.get('poll_max', 0.5),
+        'trigger_mode': data.get('trigger_mode', 'level'),
+        'hold_frames': data.get('hold_frames', 1),
+        'off_tolerance': data.get('off_tolerance'),
+        'cooldown': data.get('cooldown', 0.0),
+    }
+
+    value = task['condition_value']
+    if condition_type not in CONDITION_TYPES:
+        error(f"condition_type desconhecido: {condition_type}")
+    elif condition_type == 'time':
+        if not is_number(value) or value <= 0:
+            error("intervalo de tempo deve ser um número positivo")
+    elif condition_type == 'color':
+        if not is_color(value):
+            error("cor deve ser [r, g, b] com valores de 0 a 255")
+        else:
+            task['condition_value'] = list(value)
+        if not is_point(data.get('condition_position')):
+            error("condition_position ausente ou inválida")
+        else:
+            task['condition_position'] = point(data['condition_position'])
+    elif condition_type == 'template':
+        if not is_number(value) or not 0 <= value <= 1:
+            error("score mínimo do template deve estar entre 0 e 1")
+        if not isinstance(task['template_path'], str) or not task['template_path']:
+            error("template_path ausente")
+    elif condition_type == 'compound':
+        leaves = []
+        try:
+            compile_condition_tree(value, leaves)
+        except (ValueError, TypeError, KeyError) as e:
+            error(f"condição composta inválida: {e}")
+        else:
+            for message in check_condition_leaves(leaves):
+                error(message)
+    if condition_type != 'template':
+        task['template_path'] = None
+    if data.get('search_region') is not None:
+        if is_region(data['search_region']):
+            task['search_region'] = [int(v) for v in data['search_region']]
+        else:
+            error("search_region deve ser [x, y, largura, altura]")
+
+    if action_type not in ACTION_TYPES:
+        error(f"action_type desconhecido: {action_type}")
+    elif action_type == 'sequence':
+        sequence = data.get('sequence')
+        if not isinstance(sequence, list) or not sequence or not all(is_point(p) for p in sequence):
+            error("sequência sem posições válidas")
+        else:
+            task['sequence'] = [point(p) for p in sequence]
+        if not is_number(task['delay']) or task['delay'] < 0:
+            error("delay da sequência deve ser um número >= 0")
+    else:
+        if not is_point(data.get('action_position')):
+            error("action_position ausente ou inválida")
+        else:
+            task['action_position'] = point(data['action_position'])
+        if action_type == 'clicks':
+            if not is_number(task['frequency']) or task['frequency'] <= 0:
+                error("frequência deve ser positiva")
+            if not is_number(task['duration']) or task['duration'] <= 0:
+                error("duração deve ser positiva")
+
+    if not isinstance(task['priority'], int):
+        error("prioridade deve ser inteira")
+    if task['tolerance_mode'] not in TOLERANCE_MODES:
+        error(f"tolerance_mode desconhecido: {task['tolerance_mode']}")
+    if not is_number(task['tolerance']) or task['tolerance'] < 0:
+        error("tolerância deve ser >= 0")
+    if task['off_tolerance'] is not None and not is_number(task['off_tolerance']):
+        error("off_tolerance deve ser numérica")
+    if task['trigger_mode'] not in TRIGGER_MODES:
+        error(f"trigger_mode desconhecido: {task['trigger_mode']}")
+    if not isinstance(task['hold_frames'], int) or task['hold_frames'] < 1:
+        error("hold_frames deve ser um inteiro >= 1")
+    if not is_number(task['cooldown']) or task['cooldown'] < 0:
+        error("cooldown deve ser >= 0")
+    if not is_number(task['poll_min']) or task['poll_min'] <= 0:
+        error("poll_min deve ser positivo")
+    elif not is_number(task['poll_max']):
+        error("poll_max deve ser numérico")
+    else:
+        task['poll_max'] = max(task['poll_max'], task['poll_min'])
+    return task
+
+
+def compile_profile(data, path='<perfil>', origin=None):
+    # Perfis antigos (posições absolutas) precisam da origem atual da janela
+    if not isinstance(data, dict):
+        raise ProfileError(path, ["o arquivo não contém um objeto JSON"])
+    if data.get('coordinates') != WINDOW_COORDINATES:
+        if origin is None:
+            raise LegacyProfileError(path)
+        data = convert_legacy_profile(data, origin)
+    errors = []
+    tasks_data = data.get('tasks', [])
+    if not isinstance(tasks_data, list):
+        raise ProfileError(path, ["'tasks' deve ser uma lista"])
+    tasks = [normalize_task(task_data, index, errors) for index, task_data in enumerate(tasks_data)]
+    area = data.get('selected_area')
+    if area is not None and not is_region(area):
+        errors.append("selected_area deve ser [x, y, largura, altura]")
+    if errors:
+        raise ProfileError(path, errors)
+    return {
+        'compiler_version': COMPILER_VERSION,
+        'coordinates': WINDOW_COORDINATES,
+        'selected_area': [int(v) for v in area] if area else None,
+        'tasks': tasks,
+    }
+
+
+def file_hash(raw):
+    return hashlib.sha1(raw).hexdigest()
+
+
+def load_profile(path, origin=None, use_cache=True):
+    # Retorna o perfil compilado, do cache quando o hash do JSON bate
+    with open(path, 'rb') as file:
+        raw = file.read()
+    digest = file_hash(raw)
+    cache_path = path + CACHE_SUFFIX
+    if use_cache:
+        try:
+            with open(cache_path, 'r') as file:
+                cached = json.load(file)
+            if cached.get('source_hash') == digest and cached.get('compiler_version') == COMPILER_VERSION:
+                return cached
+        except (OSError, ValueError):
+            pass
+    data = json.loads(raw)
+    legacy = isinstance(data, dict) and data.get('coordinates') != WINDOW_COORDINATES
+    compiled = compile_profile(data, path, origin)
+    compiled['source_hash'] = digest
+    # Perfis antigos dependem da posição atual da janela: não vão para o cache
+    if use_cache and not legacy:
+        temporary = cache_path + '.tmp'
+        try:
+            with open(temporary, 'w') as file:
+                json.dump(compiled, file)
+            os.replace(temporary, cache_path)
+        except OSError as e:
+            print(f"Erro ao gravar o cache do perfil {cache_path}: {e}")
+    return compiled
@@ -0,0 +1,307 @@
+import heapq
+import itertools
+import threading
+import time
+from collections import deque
+
+from eventlog import ErrorReporter
+
+
+class AdaptivePoller:
+    # Intervalo de polling de uma task de cor/template entre poll_min e poll_max.
+    # Volta ao mínimo quando a condição muda ou dispara, acelera quando os pixels
+    # observados mudam e desacelera aos poucos com a tela parada, limitado pelo
+    # intervalo médio observado entre mudanças e pelo tempo desde o último disparo.
+    def __init__(self, poll_min, poll_max, growth=1.5, history=16):
+        self.poll_min = poll_min
+        self.poll_max = max(poll_max, poll_min)
+        self.growth = growth
+        self.interval = poll_min
+        self.last_result = None
+        self.flips = deque(maxlen=history)
+        self.last_fired = None
+        self.evaluations = 0
+
+    def update(self, result, now, fired=None, changed=False):
+        # result alimenta a detecção de mudanças; fired diz se a avaliação virou
+        # disparo (decisão do TriggerGate). Sem gate, todo resultado verdadeiro dispara.
+        # changed: os pixels lidos por esta task mudaram desde a última leitura.
+        if fired is None:
+            fired = result
+        self.evaluations += 1
+        flipped = self.last_result is not None and result != self.last_result
+        self.last_result = result
+        if flipped:
+            self.flips.append(now)
+        if fired:
+            self.last_fired = now
+        if flipped or fired:
+            self.interval = self.poll_min
+            return self.interval
+        if changed:
+            # Tela mexendo sem mudar o resultado: acelera em vez de recuar
+            self.interval = max(self.poll_min, self.interval / self.growth)
+            return self.interval
+        limit = self.poll_max
+        if len(self.flips) >= 2:
+            # Amostra pelo menos 4 vezes dentro do intervalo típico entre mudanças
+            mean_gap = (self.flips[-1] - self.flips[0]) / (len(self.flips) - 1)
+            limit = min(limit, mean_gap / 4)
+        if self.last_fired is not None:
+            limit = min(limit, (now - self.last_fired) / 4)
+        self.interval = max(self.poll_min, min(self.interval * self.growth, limit))
+        return self.interval
+
+    def metrics(self):
+        return {
+            'interval': self.interval,
+            'rate_hz': 1 / self.interval if self.interval else None,
+            'evaluations': self.evaluations,
+            'flips': len(self.flips),
+            'last_fired': self.last_fired,
+        }
+
+
+TRIGGER_MODES = ('level', 'rising', 'hold')
+
+
+class TriggerGate:
+    # Decide quando uma condição verdadeira vira disparo:
+    # 'level'  dispara a cada avaliação verdadeira (comportamento antigo)
+    # 'rising' dispara uma vez por período ligado, na borda de subida
+    # 'hold'   dispara uma vez quando a condição fica ligada por hold_frames avaliações seguidas
+    # cooldown é o intervalo mínimo entre disparos; um disparo barrado por ele
+    # acontece assim que o cooldown acabar, se a condição ainda estiver ligada.
+    def __init__(self, mode='level', hold_frames=1, cooldown=0.0):
+        self.mode = mode
+        self.hold_frames = max(1, hold_frames)
+        self.cooldown = cooldown
+        self.streak = 0
+        self.fired = False  # Já disparou no período ligado atual
+        self.last_fire = None
+        # Quando um disparo pendente pode acontecer ('hold' acumulando avaliações
+        # ou cooldown correndo); None se não há disparo pendente
+        self.ready_at = None
+
+    def update(self, result, now):
+        self.ready_at = None
+        if not result:
+            self.streak = 0
+            self.fired = False
+            return False
+        self.streak += 1
+        if self.mode == 'rising':
+            ready = not self.fired
+        elif self.mode == 'hold':
+            ready = not self.fired and self.streak >= self.hold_frames
+        else:
+            ready = True
+        if not ready:
+            if self.mode == 'hold' and not self.fired:
+                self.ready_at = now
+            return False
+        if self.last_fire is not None and now - self.last_fire < self.cooldown:
+            self.ready_at = self.last_fire + self.cooldown
+            return False
+        self.fired = True
+        self.last_fire = now
+        return True
+
+
+class TaskScheduler:
+    # Uma única thread com um heap de timers cuida dos triggers de tempo e de cor
+    # de todas as tasks. start/stop de uma task só mexem no heap, sem join.
+    def __init__(self, frame_capture, executor, batch_window=0.02, event_log=None, late_threshold=0.05, errors=None):
+        self.frame_capture = frame_capture
+        self.executor = executor
+        self.event_log = event_log  # EventLog opcional
+        self.errors = errors or ErrorReporter(event_log)
+        # Atraso a partir do qual um timer vencido é registrado como deadline perdido
+        self.late_threshold = late_threshold
+        # Tasks de cor que vencem dentro desta janela entram na mesma captura
+        self.batch_window = batch_window
+        self.pollers = {}  # task -> AdaptivePoller
+        self.gates = {}  # task -> TriggerGate
+        self.heap = []  # (deadline, seq, generation, task)
+        self.generations = {}  # task -> geração atual; entradas antigas são ignoradas
+        self.counter = itertools.count()
+        self.running = False
+        self.thread = None
+        self.cond = threading.Condition()
+
+    def add(self, task):
+        self.add_many([task])
+
+    def add_many(self, tasks):
+        # Liga várias tasks de uma vez: um único lock e um único notify. Uma task
+        # já registrada ganha nova geração, gate e poller com os parâmetros atuais.
+        if not tasks:
+            return
+        with self.cond:
+            now = time.monotonic()
+            for task in tasks:
+                generation = next(self.counter)
+                self.generations[task] = generation
+                if task.condition_type == 'time':
+                    delay = task.condition_value
+                    # Task re-registrada depois de trocar de condição
+                    self.pollers.pop(task, None)
+                    self.gates.pop(task, None)
+                else:
+                    delay = 0
+                    self.pollers[task] = AdaptivePoller(task.poll_min, task.poll_max)
+                    self.gates[task] = TriggerGate(task.trigger_mode, task.hold_frames, task.cooldown)
+                self.push(now + delay, generation, task)
+            self.prime()
+            if not self.running:
+                self.running = True
+                self.thread = threading.Thread(target=self.run, daemon=True)
+                self.thread.start()
+            self.cond.notify()
+
+    def remove(self, task):
+        self.remove_many([task])
+
+    def remove_many(self, tasks):
+        if not tasks:
+            return
+        with self.cond:
+            for task in tasks:
+                self.generations.pop(task, None)
+                self.pollers.pop(task, None)
+                self.gates.pop(task, None)
+            self.prime()
+            self.cond.notify()
+        self.executor.cancel_many(tasks)
+
+    def shutdown(self):
+        with self.cond:
+            self.generations.clear()
+            self.pollers.clear()
+            self.gates.clear()
+            self.heap = []
+            self.running = False
+            self.cond.notify()
+
+    def push(self, deadline, generation, task):
+        heapq.heappush(self.heap, (deadline, next(self.counter), generation, task))
+
+    def rearm(self, task, generation, delay):
+        with self.cond:
+            if self.generations.get(task) == generation:
+                self.push(time.monotonic() + delay, generation, task)
+                self.cond.notify()
+
+    def run(self):
+        while True:
+            with self.cond:
+                while True:
+                    if not self.running:
+                        return
+                    now = time.monotonic()
+                    if self.heap and self.heap[0][0] <= now:
+                        break
+                    self.cond.wait(self.heap[0][0] - now if self.heap else None)
+                due = []
+                while self.heap and self.heap[0][0] <= now:
+                    deadline, _, generation, task = heapq.heappop(self.heap)
+                    if self.generations.get(task) == generation:
+                        due.append((task, generation))
+                        if self.event_log and now - deadline > self.late_threshold:
+                            self.event_log.emit('missed_deadline', task=task.name, late_ms=round((now - deadline) * 1000, 2))
+                # Adianta tasks de cor quase vencidas para compartilhar a captura
+                if any(task.condition_type != 'time' for task, _ in due):
+                    early = []
+                    while self.heap and self.heap[0][0] <= now + self.batch_window:
+                        entry = heapq.heappop(self.heap)
+                        if entry[3].condition_type == 'time':
+                            early.append(entry)
+                        elif self.generations.get(entry[3]) == entry[2]:
+                            due.append((entry[3], entry[2]))
+                    for entry in early:
+                        heapq.heappush(self.heap, entry)
+            try:
+                self.dispatch(due)
+                self.errors.clear('scheduler')
+            except Exception as e:
+                self.errors.error('scheduler', f"Erro no scheduler: {e}")
+
+    def dispatch(self, due):
+        frame_due = []
+        for task, generation in due:
+            if task.condition_type == 'time':
+                # O próximo intervalo conta a partir do fim da ação, como antes
+                def on_done(task, generation=generation):
+                    self.rearm(task, generation, task.condition_value)
+                if not self.trigger(task, time.monotonic(), on_done):
+                    self.rearm(task, generation, task.condition_value)
+            elif task.condition_type in ('color', 'compound', 'template'):
+                frame_due.append((task, generation))
+        if frame_due:
+            # O avaliador conhece todas as tasks de cor ativas (fica estável entre
+            # ticks), mas só as posições das devidas são capturadas: uma task lenta
+            # não é lida no ritmo da mais rápida
+            tasks = self.frame_tasks()
+            tasks += [task for task, _ in frame_due if task.condition_type == 'template']
+            observed = time.monotonic()
+            try:
+                matches = self.frame_capture.evaluate(tasks, [task for task, _ in frame_due])
+                self.errors.clear('capture')
+            except Exception as e:
+                self.errors.error('capture', f"Erro na captura de tela: {e}")
+                matches = {}
+            now = time.monotonic()
+            # Mudança por task: só os pixels que a própria task lê
+            changed = self.frame_capture.changed_tasks
+            if self.event_log and changed:
+                # Valor lido em cada posição observada, só quando ele mudou
+                for task, _ in frame_due:
+                    if task.condition_type == 'color' and task in changed:
+                        self.event_log.emit(
+                            'pixel_seen', task=task.name, position=task.condition_position,
+                            value=self.frame_capture.get_pixel(task.condition_position), matched=bool(matches.get(task))
+                        )
+            for task, generation in frame_due:
+                matched = bool(matches.get(task))
+                gate = self.gates.get(task)
+                fired = gate.update(matched, now) if gate else matched
+                if fired:
+                    self.trigger(task, observed)
+                # O poller acelera com mudanças e disparos, não com a condição
+                # apenas ligada ('rising'/'hold' já disparado, cooldown)
+                poller = self.pollers.get(task)
+                interval = poller.update(matched, now, fired, task in changed) if poller else task.poll_min
+                if gate and gate.ready_at is not None:
+                    # Disparo pendente: o backoff não pode atrasá-lo
+                    interval = min(interval, max(gate.ready_at - now, task.poll_min))
+                self.rearm(task, generation, interval)
+
+    def trigger(self, task, observed, on_done=None):
+        # Guarda quando a condição foi vista, para medir a latência até o primeiro
+        # clique; um disparo coalescido não sobrescreve o da ação pendente
+        if not self.executor.is_busy(task):
+            task.triggered_at = observed
+        accepted = self.executor.submit(task, on_done)
+        if accepted:
+            # Estado exibido por task na GUI
+            task.fire_count += 1
+            task.last_fired = time.time()
+        if self.event_log:
+            self.event_log.emit('trigger_fired', task=task.name, condition=task.condition_type, coalesced=not accepted)
+        return accepted
+
+    def prime(self):
+        # Com o lock ainda tomado, antes de acordar a thread: o avaliador vetorizado
+        # fica pronto com a mesma lista que o próximo tick vai passar, e não é
+        # remontado dentro do loop
+        self.frame_capture.prime(self.frame_tasks())
+
+    def frame_tasks(self):
+        # Tasks de cor/compostas ativas, na ordem em que o avaliador as recebe
+        with self.cond:
+            return [task for task in self.pollers if task.condition_type in ('color', 'compound')]
+
+    def metrics(self):
+        # Estado atual de polling de cada task de cor/template: {task: {...}}
+        with self.cond:
+            return {task: poller.metrics() for task, poller in self.pollers.items()}
@@ -0,0 +1,263 @@
+import os
+import threading
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+# Acima deste custo (pixels da imagem x pixels do template) a correlação vai por FFT
+FFT_THRESHOLD = 1_000_000
+MIN_TEMPLATE_SIDE = 8
+MAX_LEVELS = 4
+# Patches menores que 2 * MIN_TEMPLATE_SIDE buscam no frame reduzido pelas fases
+# do template (ver PreparedTemplate); cada fase precisa de ao menos este lado
+MIN_PHASE_SIDE = 3
+# Janelas com desvio-padrão abaixo disto (níveis de cinza) são lisas: score 0
+MIN_WINDOW_STD = 0.5
+GRAY_WEIGHTS = np.array([0.299, 0.587, 0.114], dtype=np.float32)
+
+
+def to_gray(frame):
+    frame = np.asarray(frame)
+    if frame.ndim == 2:
+        return frame.astype(np.float32)
+    return frame[:, :, :3].astype(np.float32) @ GRAY_WEIGHTS
+
+
+def downsample(image):
+    # Média 2x2: próximo nível da pirâmide
+    height, width = image.shape[0] // 2 * 2, image.shape[1] // 2 * 2
+    image = image[:height, :width]
+    return (image[0::2, 0::2] + image[1::2, 0::2] + image[0::2, 1::2] + image[1::2, 1::2]) * 0.25
+
+
+def fast_length(n):
+    # Menor tamanho >= n só com fatores 2, 3 e 5: a FFT fica bem mais rápida
+    best = 1 << max(n - 1, 0).bit_length()
+    power5 = 1
+    while power5 < best:
+        power35 = power5
+        while power35 < best:
+            size = power35
+            while size < n:
+                size *= 2
+            best = min(best, size)
+            power35 *= 3
+        power5 *= 5
+    return best
+
+
+def build_pyramid(image, levels):
+    pyramid = [image]
+    for _ in range(levels - 1):
+        pyramid.append(downsample(pyramid[-1]))
+    return pyramid
+
+
+def window_sums(image, height, width):
+    # Soma de cada janela height x width via imagem integral
+    integral = np.zeros((image.shape[0] + 1, image.shape[1] + 1), dtype=np.float64)
+    integral[1:, 1:] = image.cumsum(axis=0).cumsum(axis=1)
+    return (integral[height:, width:] - integral[:-height, width:]
+            - integral[height:, :-width] + integral[:-height, :-width])
+
+
+def ncc_maps(image, templates, use_fft=None):
+    # Correlação cruzada normalizada de cada template (todos do mesmo tamanho)
+    # sobre image, apenas posições válidas. A FFT da imagem e as somas por
+    # janela são calculadas uma vez para todos.
+    image_h, image_w = image.shape
+    tpl_h, tpl_w = templates[0].shape
+    if image_h < tpl_h or image_w < tpl_w:
+        return [np.zeros((0, 0), dtype=np.float32) for _ in templates]
+    if use_fft is None:
+        use_fft = image.size * tpl_h * tpl_w * len(templates) > FFT_THRESHOLD
+    if use_fft:
+        shape = (fast_length(image_h + tpl_h - 1), fast_length(image_w + tpl_w - 1))
+        image_spectrum = np.fft.rfft2(image, shape)
+    else:
+        windows = sliding_window_view(image, (tpl_h, tpl_w))
+    count = tpl_h * tpl_w
+    image = image.astype(np.float64)
+    sums = window_sums(image, tpl_h, tpl_w)
+    squares = window_sums(image * image, tpl_h, tpl_w)
+    variance = np.maximum(squares - sums * sums / count, 0)
+    # Em janelas lisas o denominador é só ruído numérico (scores acima de 1)
+    textured = variance > count * MIN_WINDOW_STD ** 2
+    # Como tpl tem média zero, sum(tpl * (I - média(I))) == sum(tpl * I)
+    window_norm = np.sqrt(variance)
+    results = []
+    for template in templates:
+        tpl = template - template.mean()
+        tpl_norm = np.sqrt(np.sum(tpl * tpl))
+        if tpl_norm < 1e-6:
+            # Template liso não correlaciona com nada
+            results.append(np.zeros(textured.shape, dtype=np.float32))
+            continue
+        if use_fft:
+            spectrum = image_spectrum * np.fft.rfft2(tpl[::-1, ::-1], shape)
+            corr = np.fft.irfft2(spectrum, shape)[tpl_h - 1:image_h, tpl_w - 1:image_w]
+        else:
+            corr = np.einsum('ijkl,kl->ij', windows, tpl, optimize=True)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            scores = np.where(textured, corr / (window_norm * tpl_norm), 0)
+        results.append(np.clip(scores, -1, 1).astype(np.float32))
+    return results
+
+
+def ncc_map(image, template, use_fft=None):
+    return ncc_maps(image, [template], use_fft)[0]
+
+
+class PreparedTemplate:
+    # Template já convertido para cinza e com a pirâmide pronta
+    def __init__(self, image):
+        gray = to_gray(image)
+        levels = 1
+        height, width = gray.shape
+        while levels < MAX_LEVELS and min(height, width) >> levels >= MIN_TEMPLATE_SIDE:
+            levels += 1
+        self.levels = levels
+        self.pyramid = build_pyramid(gray, levels)
+        self.shape = gray.shape
+        # Patch pequeno demais para a pirâmide: a busca completa ainda roda no
+        # frame reduzido à metade, com as 4 fases (dx, dy) do template reduzido,
+        # para o ponto certo pontuar alto qualquer que seja o alinhamento com a
+        # grade 2x2. Sem isso, um patch de 9x9 varria o frame em resolução cheia.
+        self.phases = []
+        if levels == 1 and min(height, width) >= 2 * MIN_PHASE_SIDE + 1:
+            half_h, half_w = (height - 1) // 2, (width - 1) // 2
+            self.phases = [
+                (dx, dy, downsample(gray[dy:dy + 2 * half_h, dx:dx + 2 * half_w]))
+                for dy in (0, 1) for dx in (0, 1)
+            ]
+
+    @classmethod
+    def from_file(cls, path):
+        from PIL import Image
+        with Image.open(path) as image:
+            return cls(np.asarray(image.convert('RGB')))
+
+
+def top_peaks(scores, count, radius):
+    # Os count melhores picos distintos: cada pico escolhido apaga a vizinhança,
+    # para os candidatos não serem pixels vizinhos do mesmo pico
+    scores = scores.copy()
+    width = scores.shape[1]
+    points = []
+    for _ in range(min(count, scores.size)):
+        i = int(np.argmax(scores))
+        y, x = divmod(i, width)
+        if points and scores[y, x] == -np.inf:
+            break
+        points.append((x, y))
+        scores[max(y - radius, 0):y + radius + 1, max(x - radius, 0):x + radius + 1] = -np.inf
+    return points
+
+
+def coarse_candidates(prepared, images, levels, candidates):
+    # Busca completa no nível mais grosso: (score, pontos no nível levels - 1)
+    template = prepared.pyramid[levels - 1]
+    radius = max(1, min(template.shape) // 2)
+    scores = ncc_map(images[levels - 1], template)
+    if scores.size == 0:
+        return 0.0, []
+    points = top_peaks(scores, candidates, radius)
+    return float(scores[points[0][1], points[0][0]]), points
+
+
+def phase_candidates(prepared, image, candidates):
+    # Busca completa no frame reduzido com as fases do template; os pontos voltam
+    # para a resolução cheia (2 * x - dx)
+    coarse = downsample(image)
+    maps = ncc_maps(coarse, [template for _, _, template in prepared.phases])
+    radius = max(1, min(prepared.phases[0][2].shape) // 2)
+    found = []
+    for (dx, dy, _), scores in zip(prepared.phases, maps):
+        if scores.size == 0:
+            return []
+        for x, y in top_peaks(scores, candidates, radius):
+            found.append((float(scores[y, x]), (max(2 * x - dx, 0), max(2 * y - dy, 0))))
+    found.sort(reverse=True)
+    return [point for _, point in found[:candidates]]
+
+
+def refine(image, template, points, radius):
+    # NCC só em volta de cada ponto; retorna [(score, ponto)] do melhor ao pior
+    tpl_h, tpl_w = template.shape
+    refined = []
+    for x, y in points:
+        x0 = max(x - radius, 0)
+        y0 = max(y - radius, 0)
+        x1 = min(x + radius + tpl_w, image.shape[1])
+        y1 = min(y + radius + tpl_h, image.shape[0])
+        local = ncc_map(image[y0:y1, x0:x1], template, use_fft=False)
+        if local.size == 0:
+            continue
+        i = int(np.argmax(local))
+        refined.append((float(local.ravel()[i]), (x0 + i % local.shape[1], y0 + i // local.shape[1])))
+    refined.sort(reverse=True)
+    return refined
+
+
+def match_template(prepared, frame, candidates=3, refine_radius=2):
+    # Busca do grosso para o fino: NCC completa só no nível mais baixo da
+    # pirâmide (ou no frame reduzido, para patches pequenos) e, nos níveis
+    # seguintes, apenas em volta dos melhores candidatos.
+    # Retorna (score, (x, y)) do canto superior esquerdo no frame.
+    image = to_gray(frame)
+    if prepared.phases:
+        points = phase_candidates(prepared, image, candidates)
+        if points:
+            refined = refine(image, prepared.pyramid[0], points, 1)
+            if refined:
+                return refined[0]
+    levels = prepared.levels
+    while levels > 1 and any(
+        side >> (levels - 1) < tpl_side for side, tpl_side in zip(image.shape, prepared.pyramid[levels - 1].shape)
+    ):
+        levels -= 1
+    images = build_pyramid(image, levels)
+    best_score, points = coarse_candidates(prepared, images, levels, candidates)
+    if not points:
+        return 0.0, None
+    best_point = points[0]
+    for level in range(levels - 2, -1, -1):
+        refined = refine(images[level], prepared.pyramid[level], [(x * 2, y * 2) for x, y in points], refine_radius)
+        if not refined:
+            break
+        points = [point for _, point in refined[:candidates]]
+        best_score, best_point = refined[0]
+    return best_score, best_point
+
+
+class TemplateCache:
+    # Templates pré-processados por perfil; recarrega se o arquivo mudar no disco
+    def __init__(self):
+        self.entries = {}  # (perfil, caminho) -> (mtime, PreparedTemplate)
+        self.lock = threading.Lock()
+
+    def get(self, profile, path):
+        mtime = os.path.getmtime(path)
+        key = (profile, path)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry and entry[0] == mtime:
+                return entry[1]
+        prepared = PreparedTemplate.from_file(path)
+        with self.lock:
+            self.entries[key] = (mtime, prepared)
+        return prepared
+
+    def preload(self, profile, paths):
+        for path in paths:
+            try:
+                self.get(profile, path)
+            except OSError as e:
+                print(f"Erro ao carregar template {path}: {e}")
+
+    def clear(self, profile=None):
+        with self.lock:
+            if profile is None:
+                self.entries = {}
+            else:
+                self.entries = {key: value for key, value in self.entries.items() if key[0] != profile}
@@ -0,0 +1,74 @@
+import pytest
+
+import actions
+from actions import run_click_burst
+
+
+class FakeClock:
+    # Relógio manual: o sleep do burst só avança o tempo até o deadline
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep_until(self, deadline, clock=None):
+        self.now = max(self.now, deadline)
+
+
+def make_burst(monkeypatch, click_cost=0.0):
+    clock = FakeClock()
+    monkeypatch.setattr(actions, 'precise_sleep_until', clock.sleep_until)
+    clicks = []
+
+    def click():
+        clicks.append(clock.now)
+        clock.now += click_cost
+
+    return clock, clicks, click
+
+
+def test_burst_clicks_on_absolute_deadlines(monkeypatch):
+    clock, clicks, click = make_burst(monkeypatch, click_cost=0.01)
+    result = run_click_burst(click, 20, 1.0, clock=clock)
+    assert result.completed
+    assert result.clicks == len(clicks) == 20
+    # O custo de cada clique não empurra os seguintes
+    assert clicks == pytest.approx([slot / 20 for slot in range(20)])
+    assert result.elapsed == pytest.approx(1.0)
+    assert result.rate == pytest.approx(20)
+
+
+def test_burst_realigns_after_long_stall(monkeypatch):
+    clock, clicks, click = make_burst(monkeypatch)
+
+    def stalling_click():
+        click()
+        if len(clicks) == 2:
+            clock.now += 0.5  # Máquina travada por 10 intervalos
+
+    result = run_click_burst(stalling_click, 20, 1.0, clock=clock)
+    # Sem rajada para recuperar o atraso: os deadlines perdidos são pulados
+    assert all(later - earlier >= 0.05 - 1e-9 for earlier, later in zip(clicks, clicks[1:]))
+    assert result.clicks < 20
+
+
+def test_preempted_burst_resumes_at_next_deadline(monkeypatch):
+    clock, clicks, click = make_burst(monkeypatch)
+    first = run_click_burst(click, 20, 1.0, lambda: len(clicks) == 7, clock)
+    assert not first.completed
+    assert first.clicks == 7
+    assert first.scheduled == pytest.approx(7 / 20)
+    assert first.elapsed == pytest.approx(first.scheduled)
+    second = run_click_burst(click, 20, 1.0 - first.scheduled, clock=clock)
+    # Parado e retomado uma vez: os mesmos 20 cliques de um burst inteiro
+    assert first.clicks + second.clicks == 20
+    assert (first.clicks + second.clicks) / (first.elapsed + second.elapsed) == pytest.approx(20)
+
+
+def test_stopped_burst_reports_its_rate(monkeypatch):
+    clock, clicks, click = make_burst(monkeypatch)
+    result = run_click_burst(click, 10, 2.0, lambda: len(clicks) == 5, clock)
+    assert not result.completed
+    assert result.clicks == 5
+    assert result.rate == pytest.approx(10)
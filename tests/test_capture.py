@@ -0,0 +1,25 @@
+from capture import plan_capture_regions
+
+
+def test_nearby_points_share_one_box():
+    assert plan_capture_regions([(10, 10), (20, 15), (10, 10)], merge_distance=48) == [(10, 10, 11, 6)]
+
+
+def test_distant_points_get_separate_boxes():
+    regions = plan_capture_regions([(0, 0), (200, 300)], merge_distance=48)
+    assert sorted(regions) == [(0, 0, 1, 1), (200, 300, 1, 1)]
+
+
+def test_merging_is_transitive():
+    # a-b e b-c estão perto, a-c não: tudo acaba numa caixa só
+    regions = plan_capture_regions([(0, 0), (40, 0), (80, 0)], merge_distance=48)
+    assert regions == [(0, 0, 81, 1)]
+
+
+def test_points_outside_bounds_are_dropped():
+    regions = plan_capture_regions([(5, 5), (50, 50), (-1, 5)], bounds=(0, 0, 20, 20))
+    assert regions == [(5, 5, 1, 1)]
+
+
+def test_no_points_no_regions():
+    assert plan_capture_regions([]) == []
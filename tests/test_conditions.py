@@ -0,0 +1,91 @@
+import numpy as np
+
+from conditions import ColorConditionEvaluator
+from engine import Task
+
+
+def frame_with(pixels, size=(20, 20)):
+    frame = np.zeros((size[1], size[0], 3), dtype=np.uint8)
+    for (x, y), color in pixels.items():
+        frame[y, x] = color
+    return frame
+
+
+def color_task(name, position, color, mode='exact', tolerance=0, off_tolerance=None):
+    return Task(name, 'color', color, position, 'click', (0, 0), tolerance_mode=mode, tolerance=tolerance,
+                off_tolerance=off_tolerance)
+
+
+def compound_task(name, tree):
+    return Task(name, 'compound', tree, None, 'click', (0, 0))
+
+
+def results(evaluator, frame, latched=None, origin=(0, 0)):
+    samples, valid = evaluator.sample(frame, origin)
+    matches = evaluator.evaluate_samples(samples, valid)
+    return evaluator.task_results(matches, latched, evaluator.condition_valid(valid).tolist())
+
+
+def test_tolerance_modes():
+    position = (3, 4)
+    evaluator = ColorConditionEvaluator(
+        [position] * 4,
+        [(100, 100, 100), (100, 100, 100), (100, 100, 100), (200, 0, 0)],
+        [('exact', 0), ('channel', 5), ('euclidean', 6), ('hue', 10)],
+    )
+    assert evaluator.evaluate(frame_with({position: (100, 100, 100)})).tolist() == [True, True, True, False]
+    assert evaluator.evaluate(frame_with({position: (104, 96, 100)})).tolist() == [False, True, True, False]
+    assert evaluator.evaluate(frame_with({position: (105, 105, 100)})).tolist() == [False, True, False, False]
+    # Mesmo matiz, outro brilho: só o modo hue casa
+    assert evaluator.evaluate(frame_with({position: (90, 0, 0)})).tolist() == [False, False, False, True]
+
+
+def test_positions_outside_the_frame_never_match():
+    evaluator = ColorConditionEvaluator([(30, 30)], [(0, 0, 0)])
+    assert evaluator.evaluate(frame_with({})).tolist() == [False]
+
+
+def test_hysteresis_keeps_task_on_until_off_tolerance():
+    task = color_task('hp', (5, 5), (100, 100, 100), 'channel', 2, off_tolerance=20)
+    latched = set()
+    evaluator = ColorConditionEvaluator.from_tasks([task])
+    assert results(evaluator, frame_with({(5, 5): (110, 100, 100)}), latched) == {task: False}
+    assert results(evaluator, frame_with({(5, 5): (101, 100, 100)}), latched) == {task: True}
+    assert results(evaluator, frame_with({(5, 5): (110, 100, 100)}), latched) == {task: True}
+    assert results(evaluator, frame_with({(5, 5): (130, 100, 100)}), latched) == {task: False}
+    assert results(evaluator, frame_with({(5, 5): (110, 100, 100)}), latched) == {task: False}
+
+
+def test_hysteresis_latch_survives_evaluator_rebuild():
+    task = color_task('hp', (5, 5), (100, 100, 100), 'channel', 2, off_tolerance=20)
+    other = color_task('other', (1, 1), (1, 2, 3))
+    latched = set()
+    assert results(ColorConditionEvaluator.from_tasks([task]), frame_with({(5, 5): (100, 100, 100)}), latched)[task]
+    # Outra task ligada remonta o avaliador; o latch fica com quem chama
+    rebuilt = ColorConditionEvaluator.from_tasks([task, other])
+    assert results(rebuilt, frame_with({(5, 5): (110, 100, 100)}), latched)[task]
+
+
+def test_compound_all_any_not():
+    tree = {'all': [
+        {'pixel': [1, 1], 'color': [255, 0, 0]},
+        {'any': [{'pixel': [2, 2], 'color': [0, 255, 0]}, {'pixel': [3, 3], 'color': [0, 0, 255]}]},
+        {'not': {'pixel': [4, 4], 'color': [255, 255, 255]}},
+    ]}
+    task = compound_task('combo', tree)
+    evaluator = ColorConditionEvaluator.from_tasks([task])
+    base = {(1, 1): (255, 0, 0), (3, 3): (0, 0, 255)}
+    assert results(evaluator, frame_with(base)) == {task: True}
+    assert results(evaluator, frame_with({**base, (1, 1): (0, 0, 0)})) == {task: False}
+    assert results(evaluator, frame_with({(1, 1): (255, 0, 0)})) == {task: False}
+    blocked = frame_with(base)
+    blocked[4, 4] = (255, 255, 255)
+    assert results(evaluator, blocked) == {task: False}
+
+
+def test_not_over_unsampled_leaf_is_no_match():
+    task = compound_task('absent', {'not': {'pixel': [15, 15], 'color': [255, 255, 255]}})
+    evaluator = ColorConditionEvaluator.from_tasks([task])
+    assert results(evaluator, frame_with({})) == {task: True}
+    # Região capturada sem o pixel da folha: não amostrado não vira "falso"
+    assert results(evaluator, frame_with({}, size=(10, 10))) == {task: False}
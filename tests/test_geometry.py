@@ -0,0 +1,32 @@
+from geometry import WINDOW_COORDINATES, convert_legacy_profile
+
+
+def test_convert_legacy_profile_shifts_every_position():
+    legacy = {
+        'selected_area': [110, 220, 50, 60],
+        'tasks': [
+            {'name': 'cor', 'condition_type': 'color', 'condition_position': [130, 250],
+             'action_type': 'click', 'action_position': [140, 260]},
+            {'name': 'seq', 'condition_type': 'time', 'condition_position': None,
+             'action_type': 'sequence', 'action_position': None, 'sequence': [[100, 200], [105, 205]]},
+            {'name': 'tpl', 'condition_type': 'template', 'condition_position': None,
+             'action_type': 'click', 'action_position': [100, 200], 'search_region': [120, 230, 10, 20]},
+            {'name': 'combo', 'condition_type': 'compound', 'action_type': 'click', 'action_position': [100, 200],
+             'condition_value': {'all': [{'pixel': [150, 260], 'color': [1, 2, 3]},
+                                         {'not': {'pixel': [101, 201], 'color': [4, 5, 6]}}]}},
+        ],
+    }
+    converted = convert_legacy_profile(legacy, (100, 200))
+    assert converted['coordinates'] == WINDOW_COORDINATES
+    assert converted['selected_area'] == [10, 20, 50, 60]
+    color, sequence, template, compound = converted['tasks']
+    assert color['condition_position'] == [30, 50]
+    assert color['action_position'] == [40, 60]
+    assert sequence['sequence'] == [[0, 0], [5, 5]]
+    assert sequence['action_position'] is None
+    assert template['search_region'] == [20, 30, 10, 20]
+    assert compound['condition_value'] == {'all': [{'pixel': [50, 60], 'color': [1, 2, 3]},
+                                                   {'not': {'pixel': [1, 1], 'color': [4, 5, 6]}}]}
+    # O perfil original não é alterado
+    assert legacy['tasks'][0]['condition_position'] == [130, 250]
+    assert 'coordinates' not in legacy
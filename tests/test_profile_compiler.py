@@ -0,0 +1,115 @@
+import json
+import os
+
+import pytest
+
+from geometry import WINDOW_COORDINATES, LegacyProfileError
+from profile_compiler import CACHE_SUFFIX, ProfileError, compile_profile, load_profile
+
+
+def color_task(**fields):
+    task = {
+        'name': 'hp', 'condition_type': 'color', 'condition_value': [255, 0, 0], 'condition_position': [10, 20],
+        'action_type': 'click', 'action_position': [30, 40],
+    }
+    task.update(fields)
+    return task
+
+
+def profile(*tasks, **fields):
+    data = {'coordinates': WINDOW_COORDINATES, 'selected_area': None, 'tasks': list(tasks)}
+    data.update(fields)
+    return data
+
+
+def write(path, data):
+    with open(path, 'w') as file:
+        json.dump(data, file)
+    return str(path)
+
+
+def test_compile_fills_defaults():
+    task = compile_profile(profile(color_task()))['tasks'][0]
+    assert task['tolerance_mode'] == 'exact'
+    assert task['trigger_mode'] == 'level'
+    assert task['hold_frames'] == 1
+    assert task['poll_min'] == 0.05
+    assert task['poll_max'] == 0.5
+    assert task['template_path'] is None
+
+
+def test_compile_collects_every_error():
+    data = profile(
+        color_task(condition_value=[300, 0, 0]),
+        color_task(name='', action_type='clicks', frequency=0, duration=1),
+        {'name': 'seq', 'condition_type': 'time', 'condition_value': 1, 'action_type': 'sequence', 'sequence': []},
+    )
+    with pytest.raises(ProfileError) as error:
+        compile_profile(data, 'perfil.json')
+    messages = error.value.errors
+    assert any(message.startswith("task 0 'hp': cor") for message in messages)
+    assert any(message.startswith("task 1 '': nome vazio") for message in messages)
+    assert any("frequência" in message for message in messages)
+    assert any(message.startswith("task 2 'seq': sequência") for message in messages)
+
+
+def test_compile_rejects_bad_compound_and_area():
+    data = profile(
+        color_task(condition_type='compound', condition_value={'all': [{'pixel': [1, 2]}]}),
+        selected_area=[0, 0, 0, 10],
+    )
+    with pytest.raises(ProfileError) as error:
+        compile_profile(data)
+    assert any("condição composta inválida" in message for message in error.value.errors)
+    assert any("selected_area" in message for message in error.value.errors)
+
+
+def test_legacy_profile_needs_window_origin():
+    legacy = {'selected_area': [100, 100, 50, 50], 'tasks': [color_task(condition_position=[110, 120])]}
+    with pytest.raises(LegacyProfileError):
+        compile_profile(legacy)
+    compiled = compile_profile(legacy, origin=(100, 100))
+    assert compiled['selected_area'] == [0, 0, 50, 50]
+    assert compiled['tasks'][0]['condition_position'] == [10, 20]
+
+
+def test_cache_is_reused_until_the_profile_changes(tmp_path):
+    path = write(tmp_path / 'perfil.json', profile(color_task()))
+    first = load_profile(path)
+    assert os.path.exists(path + CACHE_SUFFIX)
+    # Cache adulterado com o mesmo hash: prova que a segunda carga vem dele
+    with open(path + CACHE_SUFFIX) as file:
+        cached = json.load(file)
+    cached['tasks'][0]['name'] = 'do cache'
+    write(path + CACHE_SUFFIX, cached)
+    assert load_profile(path)['tasks'][0]['name'] == 'do cache'
+    # JSON alterado: hash novo, recompila e regrava o cache
+    write(path, profile(color_task(name='mp')))
+    assert load_profile(path)['tasks'][0]['name'] == 'mp'
+    assert first['source_hash'] != load_profile(path)['source_hash']
+
+
+def test_cache_ignored_for_other_compiler_version(tmp_path):
+    path = write(tmp_path / 'perfil.json', profile(color_task()))
+    load_profile(path)
+    with open(path + CACHE_SUFFIX) as file:
+        cached = json.load(file)
+    cached['compiler_version'] = -1
+    cached['tasks'][0]['name'] = 'antigo'
+    write(path + CACHE_SUFFIX, cached)
+    assert load_profile(path)['tasks'][0]['name'] == 'hp'
+
+
+def test_invalid_profile_is_not_cached(tmp_path):
+    path = write(tmp_path / 'perfil.json', profile(color_task(condition_position=None)))
+    with pytest.raises(ProfileError):
+        load_profile(path)
+    assert not os.path.exists(path + CACHE_SUFFIX)
+
+
+def test_legacy_profile_is_never_cached(tmp_path):
+    path = write(tmp_path / 'antigo.json', {'selected_area': None, 'tasks': [color_task()]})
+    with pytest.raises(LegacyProfileError):
+        load_profile(path)
+    assert load_profile(path, origin=(0, 0))['tasks'][0]['condition_position'] == [10, 20]
+    assert not os.path.exists(path + CACHE_SUFFIX)
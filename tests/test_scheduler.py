@@ -0,0 +1,75 @@
+import pytest
+
+from scheduler import AdaptivePoller, TriggerGate
+
+
+def run_gate(gate, results, step=0.1):
+    return [gate.update(result, index * step) for index, result in enumerate(results)]
+
+
+def test_level_fires_on_every_true_evaluation():
+    assert run_gate(TriggerGate('level'), [True, True, False, True]) == [True, True, False, True]
+
+
+def test_rising_fires_once_per_on_period():
+    gate = TriggerGate('rising')
+    assert run_gate(gate, [True, True, True, False, True, True]) == [True, False, False, False, True, False]
+
+
+def test_hold_waits_for_consecutive_frames():
+    gate = TriggerGate('hold', hold_frames=3)
+    assert run_gate(gate, [True, True, False, True, True, True, True]) == [
+        False, False, False, False, False, True, False
+    ]
+
+
+def test_hold_marks_pending_fire_as_ready_now():
+    gate = TriggerGate('hold', hold_frames=2)
+    assert not gate.update(True, 1.0)
+    assert gate.ready_at == 1.0
+    assert gate.update(True, 1.1)
+    assert gate.ready_at is None
+
+
+def test_cooldown_delays_the_next_fire():
+    gate = TriggerGate('level', cooldown=1.0)
+    assert gate.update(True, 0.0)
+    assert not gate.update(True, 0.5)
+    assert gate.ready_at == 1.0
+    assert gate.update(True, 1.0)
+
+
+def test_poller_backs_off_while_nothing_changes():
+    poller = AdaptivePoller(0.05, 0.5, growth=2)
+    intervals = [poller.update(False, index * 0.1) for index in range(6)]
+    assert intervals == pytest.approx([0.1, 0.2, 0.4, 0.5, 0.5, 0.5])
+
+
+def test_poller_resets_on_flip_and_fire():
+    poller = AdaptivePoller(0.05, 0.5, growth=2)
+    for index in range(4):
+        poller.update(False, index)
+    assert poller.interval == 0.5
+    assert poller.update(True, 10.0, fired=False) == 0.05
+    for index in range(4):
+        poller.update(True, 11.0 + index, fired=False)
+    assert poller.update(True, 20.0, fired=True) == 0.05
+
+
+def test_poller_speeds_up_when_pixels_change():
+    poller = AdaptivePoller(0.05, 0.8, growth=2)
+    for index in range(4):
+        poller.update(False, index)
+    assert poller.interval == 0.8
+    assert poller.update(False, 5.0, changed=True) == 0.4
+    assert poller.update(False, 6.0, changed=True) == 0.2
+
+
+def test_poller_limited_by_observed_flip_rate():
+    poller = AdaptivePoller(0.05, 10.0, growth=2)
+    # Resultado alterna a cada 2 s: amostra pelo menos 4 vezes nesse intervalo
+    for index, result in enumerate([False, True, False, True]):
+        poller.update(result, index * 2.0, fired=False)
+    for index in range(10):
+        poller.update(True, 7.0 + index * 0.01, fired=False)
+    assert poller.interval == pytest.approx(0.5)
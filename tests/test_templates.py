@@ -0,0 +1,31 @@
+import numpy as np
+
+from templates import PreparedTemplate, match_template
+
+
+def textured_frame(seed=0, size=(120, 160)):
+    return np.random.default_rng(seed).integers(0, 256, size + (3,), dtype=np.uint8)
+
+
+def test_small_template_found_at_any_grid_phase():
+    frame = textured_frame()
+    for x, y in [(40, 30), (41, 30), (40, 31), (41, 31)]:
+        prepared = PreparedTemplate(frame[y:y + 9, x:x + 9])
+        assert prepared.phases
+        score, point = match_template(prepared, frame)
+        assert point == (x, y)
+        assert score > 0.99
+
+
+def test_large_template_uses_pyramid():
+    frame = textured_frame(1)
+    prepared = PreparedTemplate(frame[50:90, 70:118])
+    assert prepared.levels > 1 and not prepared.phases
+    score, point = match_template(prepared, frame)
+    assert point == (70, 50)
+    assert score > 0.99
+
+
+def test_flat_template_scores_zero():
+    score, _ = match_template(PreparedTemplate(np.full((12, 12, 3), 90, dtype=np.uint8)), textured_frame())
+    assert score == 0.0